@@ -11,11 +11,25 @@ Written by Brian P. Smith (brian.p.smith@gmail.com)
 
 (modified by Saeed Amen (saeed@pythalesians.com) for Python 3.4)
 """
-from win32gui import PumpWaitingMessages
-from win32com.client import DispatchWithEvents, constants, CastTo
+try:
+    from win32gui import PumpWaitingMessages
+    from win32com.client import DispatchWithEvents, CastTo
+except ImportError:
+    # no COM outside Windows, requests can still be run against the simulator in bbg_sim
+    PumpWaitingMessages = DispatchWithEvents = CastTo = None
 from collections import defaultdict, namedtuple
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-from pandas import DataFrame, to_datetime, concat, Panel
+import queue
+import sys
+import threading
+import time
+from pandas import DataFrame, DatetimeIndex, MultiIndex, bdate_range, to_datetime, concat
+try:
+    from pandas import Panel
+except ImportError:
+    # removed in pandas 0.25
+    Panel = None
 import numpy as np
 
 SecurityErrorAttrs = ['security', 'source', 'code', 'category', 'message', 'subcategory']
@@ -26,6 +40,11 @@ FieldError = namedtuple('FieldError', FieldErrorAttrs)
 # poor mans debugging
 DEBUG = False
 
+# bbg event types (blpapicom constants)
+SESSION_STATUS = 2
+RESPONSE = 5
+PARTIAL_RESPONSE = 6
+
 class XmlHelper(object):
     @staticmethod
     def security_iter(nodearr):
@@ -46,7 +65,7 @@ class XmlHelper(object):
             if DEBUG:
                 print(msg.Print)
             if msg.AsElement.HasElement('responseError'):
-                raise Exception(msg.AsElement.GetValue('message'))
+                raise Exception(XmlHelper.get_child_value(msg.AsElement.GetElement('responseError'), 'message'))
             yield msg
 
     @staticmethod
@@ -55,49 +74,53 @@ class XmlHelper(object):
         Note this may be a naive implementation as I assume that bulk data is always a table
         """
         assert node.Datatype == 15
-        data = defaultdict(list)
         cols = []
-        for i in range(node.NumValues):
-            row = node.GetValue(i)
-            if i == 0:  # Get the ordered cols and assume they are constant
-                cols = [str(row.GetElement(_).Name) for _ in range(row.NumElements)]
+        if node.NumValues > 0:  # Get the ordered cols and assume they are constant
+            row = node.GetValue(0)
+            cols = [str(row.GetElement(_).Name) for _ in range(row.NumElements)]
+        values = DecoderPlan(cols).decode_columns(node)
+        return DataFrame(dict(zip(cols, values)), columns=cols)
+
+    @staticmethod
+    def as_string(ele):
+        val = ele.Value
+        if val:
+            # us centric :)
+            val = val.encode('ascii', 'replace').decode('ascii')
+        return str(val)
 
-            for cidx in range(row.NumElements):
-                col = row.GetElement(cidx)
-                data[str(col.Name)].append(XmlHelper.as_value(col))
-        return DataFrame(data, columns=cols)
+    @staticmethod
+    def as_date(ele):
+        v = ele.Value
+        return datetime(year=v.year, month=v.month, day=v.day).date() if v else np.nan
+
+    @staticmethod
+    def as_time(ele):
+        v = ele.Value
+        return datetime(hour=v.hour, minute=v.minute, second=v.second).time() if v else np.nan
+
+    @staticmethod
+    def as_datetime(ele):
+        v = ele.Value
+        return datetime(year=v.year, month=v.month, day=v.day, hour=v.hour, minute=v.minute, second=v.second)
+
+    @staticmethod
+    def as_unsupported(ele):
+        names = {14: 'ENUMERATION', 16: 'CHOICE'}
+        if ele.Datatype in names:
+            raise NotImplementedError('%s data type needs implemented' % names[ele.Datatype])
+        raise NotImplementedError('Unexpected data type %s. Check documentation' % ele.Datatype)
+
+    @staticmethod
+    def decoder(dtype):
+        """ the function converting elements of a datatype to python values (None for types where it is just Value) """
+        return XmlHelper.decoders.get(dtype, XmlHelper.as_unsupported)
 
     @staticmethod
     def as_value(ele):
         """ convert the specified element as a python value """
-        dtype = ele.Datatype
-        #print '%s = %s' % (ele.Name, dtype)
-        if dtype in (1, 2, 3, 4, 5, 6, 7, 9, 12):
-            # BOOL, CHAR, BYTE, INT32, INT64, FLOAT32, FLOAT64, BYTEARRAY, DECIMAL)
-            return ele.Value
-        elif dtype == 8:  # String
-            val = ele.Value
-            if val:
-                # us centric :)
-                val = val.encode('ascii', 'replace')
-            return str(val)
-        elif dtype == 10:  # Date
-            v = ele.Value
-            return datetime(year=v.year, month=v.month, day=v.day).date() if v else np.nan
-        elif dtype == 11:  # Time
-            v = ele.Value
-            return datetime(hour=v.hour, minute=v.minute, second=v.second).time() if v else np.nan
-        elif dtype == 13:  # Datetime
-            v = ele.Value
-            return datetime(year=v.year, month=v.month, day=v.day, hour=v.hour, minute=v.minute, second=v.second)
-        elif dtype == 14:  # Enumeration
-            raise NotImplementedError('ENUMERATION data type needs implemented')
-        elif dtype == 16:  # Choice
-            raise NotImplementedError('CHOICE data type needs implemented')
-        elif dtype == 15:  # SEQUENCE
-            return XmlHelper.get_sequence_value(ele)
-        else:
-            raise NotImplementedError('Unexpected data type %s. Check documentation' % dtype)
+        decoder = XmlHelper.decoder(ele.Datatype)
+        return ele.Value if decoder is None else decoder(ele)
 
     @staticmethod
     def get_child_value(parent, name, allow_missing=0):
@@ -173,54 +196,227 @@ class XmlHelper(object):
             return None
 
 
+# converters by datatype, None where the Value is used as it is
+# (BOOL, CHAR, BYTE, INT32, INT64, FLOAT32, FLOAT64, BYTEARRAY, DECIMAL)
+XmlHelper.decoders = dict([(dtype, None) for dtype in (1, 2, 3, 4, 5, 6, 7, 9, 12)] + [
+    (8, XmlHelper.as_string),
+    (10, XmlHelper.as_date),
+    (11, XmlHelper.as_time),
+    (13, XmlHelper.as_datetime),
+    (15, XmlHelper.get_sequence_value),
+])
+
+
+class DecoderPlan(object):
+    """Decodes the same fields out of many elements (eg. the fieldData of each security, or each row of a
+    historical fieldData array).
+
+    The converter for each field is looked up once, from the first element holding it, instead of dispatching
+    on Datatype for every value, and each element's children are walked once by index instead of calling
+    HasElement and GetElement for every field
+    """
+    # converter not looked up yet
+    UNRESOLVED = object()
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.positions = dict((str(f).upper(), i) for i, f in enumerate(self.fields))
+        self.names = {}
+        self.converters = [DecoderPlan.UNRESOLVED] * len(self.fields)
+
+    def position(self, name):
+        """ index in fields of a child element name (None if it isn't one of the fields) """
+        if name not in self.names:
+            self.names[name] = self.positions.get(str(name).upper())
+        return self.names[name]
+
+    def decode_into(self, parent, values, row):
+        """ put the fields of parent into values[field position][row] """
+        position, converters, unresolved = self.position, self.converters, DecoderPlan.UNRESOLVED
+        for j in range(parent.NumElements):
+            ele = parent.GetElement(j)
+            i = position(ele.Name)
+            if i is None:
+                continue
+            convert = converters[i]
+            if convert is unresolved:
+                convert = converters[i] = XmlHelper.decoder(ele.Datatype)
+            values[i][row] = ele.Value if convert is None else convert(ele)
+
+    def decode(self, parent):
+        """ list of the values of the fields in parent (nan for fields it doesn't have) """
+        values = [[np.nan] for _ in self.fields]
+        self.decode_into(parent, values, 0)
+        return [v[0] for v in values]
+
+    def decode_columns(self, nodearr):
+        """ list of columns, one per field, of the values in each element of an array element """
+        count = nodearr.NumValues
+        values = [[np.nan] * count for _ in self.fields]
+        for row in range(count):
+            self.decode_into(nodearr.GetValue(row), values, row)
+        return values
+
+
 def debug_event(evt):
     print('unhandled event: %s' % evt.EventType)
-    if evt.EventType in [constants.RESPONSE, constants.PARTIAL_RESPONSE]:
+    if evt.EventType in [RESPONSE, PARTIAL_RESPONSE]:
         print('messages:')
         for msg in XmlHelper.message_iter(evt):
             print(msg.Print)
 
 
+class RoutedEvent(object):
+    """ messages of an event for one request, with the CreateMessageIterator of an Event for its on_event """
+    def __init__(self, event_type, messages):
+        self.EventType = event_type
+        self.messages = messages
+
+    def CreateMessageIterator(self):
+        return RoutedMessageIterator(self.messages)
+
+
+class RoutedMessageIterator(object):
+    def __init__(self, messages):
+        self.messages = iter(messages)
+        self.Message = None
+
+    def Next(self):
+        self.Message = next(self.messages, None)
+        return self.Message is not None
+
+
 class ResponseHandler(object):
+    # requests by correlation id, when many requests are in flight (see do_init_many)
+    handlers = None
+    # SESSION_STATUS messages after which the session can't be used (until SessionConnectionUp for a lost connection)
+    terminated = False
+    connection_down = False
+
     def do_init(self, handler):
         """ will be called prior to waiting for the message """
         self.waiting = True
         self.exc_info = None
         self.handler = handler
 
+    def do_init_many(self):
+        """ route events to the handlers added with add_handler by their correlation id """
+        self.waiting = False
+        self.exc_info = None
+        self.handler = None
+        self.handlers = {}
+        self.completed = []
+
+    def add_handler(self, correlation_id, handler):
+        """ handle the events for the request sent with correlation_id (as returned by SendRequest) """
+        self.handlers[self.correlation_key(correlation_id)] = handler
+        self.waiting = True
+
+    def take_completed(self):
+        """ return a list of (handler, exc_info) for the requests which have finished since the last call """
+        completed, self.completed = self.completed, []
+        return completed
+
     def set_evt_handler(self, handler):
         self.handler = handler
 
+    @property
+    def session_alive(self):
+        """ False once the session has reported it is terminated or has lost its connection """
+        return not (self.terminated or self.connection_down)
+
+    def on_session_status(self, evt):
+        """ keep track of the SESSION_STATUS messages which say whether the session can still be used """
+        iter = evt.CreateMessageIterator()
+        status = None
+        while iter.Next():
+            status = iter.Message.MessageTypeAsString
+            if status in ('SessionTerminated', 'SessionStartupFailure'):
+                self.terminated = True
+            elif status == 'SessionConnectionDown':
+                self.connection_down = True
+            elif status == 'SessionConnectionUp':
+                self.connection_down = False
+        if not self.session_alive and self.waiting:
+            # nothing more will come back for the requests in flight
+            raise Exception('bbg session is down (%s)' % status)
+
+    def cast_event(self, evt):
+        """ convert the raw event passed to OnProcessEvent into an Event (transports without COM override this) """
+        return CastTo(evt, 'Event')
+
+    def correlation_key(self, correlation_id):
+        """ hashable key for a CorrelationId (transports without COM override this) """
+        return correlation_id.Value
+
+    def route_event(self, evt):
+        """ pass the messages of a response event to the handlers for their correlation ids
+
+        with many requests in flight an event may carry messages for more than one of them, so each handler is
+        passed a RoutedEvent of just its own messages
+        """
+        routed = {}
+        iter = evt.CreateMessageIterator()
+        while iter.Next():
+            msg = iter.Message
+            routed.setdefault(self.correlation_key(msg.CorrelationId), []).append(msg)
+
+        is_final = evt.EventType == RESPONSE
+        for key, messages in routed.items():
+            handler = self.handlers.get(key)
+            if handler is None:
+                # left over from a request which has already failed
+                continue
+
+            exc_info = None
+            try:
+                handler.on_event(RoutedEvent(evt.EventType, messages), is_final=is_final)
+            except Exception:
+                exc_info = sys.exc_info()
+
+            if is_final or exc_info:
+                del self.handlers[key]
+                self.completed.append((handler, exc_info))
+        self.waiting = len(self.handlers) > 0
+
     def OnProcessEvent(self, evt):
         try:
-            evt = CastTo(evt, 'Event')
-            if not self.handler:
+            evt = self.cast_event(evt)
+            if evt.EventType == SESSION_STATUS:
+                self.on_session_status(evt)
+            if self.handlers is None and not self.handler:
+                # an idle session (eg. in the pool) has no request to pass the event to
                 debug_event(evt)
-
-            if evt.EventType == constants.RESPONSE:
+                return
+            if self.handlers is not None:
+                if evt.EventType in (RESPONSE, PARTIAL_RESPONSE):
+                    self.route_event(evt)
+                else:
+                    [h.on_admin_event(evt) for h in list(self.handlers.values())]
+                return
+            if evt.EventType == RESPONSE:
                 self.handler.on_event(evt, is_final=True)
                 self.waiting = False
-            elif evt.EventType == constants.PARTIAL_RESPONSE:
+            elif evt.EventType == PARTIAL_RESPONSE:
                 self.handler.on_event(evt, is_final=False)
             else:
                 self.handler.on_admin_event(evt)
         except Exception:
-            import sys
-
             self.waiting = False
             self.exc_info = sys.exc_info()
 
     @property
     def has_deferred_exception(self):
-        return # self.exc_info is not None
+        return self.exc_info is not None
 
     def raise_deferred_exception(self):
-        return # raise self.exc_info[1], None, self.exc_info[2]
+        raise self.exc_info[1].with_traceback(self.exc_info[2])
 
     def do_cleanup(self):
         self.waiting = False
         self.exc_info = None
         self.handler = None
+        self.handlers = None
 
 
 class Request(object):
@@ -262,6 +458,10 @@ class Request(object):
         Terminal.execute_request(self)
         return self
 
+    def submit(self):
+        """ send the request without waiting for the response, returns a Future """
+        return Terminal.submit_requests([self])[0]
+
     @staticmethod
     def apply_overrides(request, omap):
         """ add the given overrides (omap) to bbg request """
@@ -274,18 +474,27 @@ class Request(object):
 
 class ReferenceDataRequest(Request):
     def __init__(self, symbols, fields, overrides=None, response_type='frame', ignore_security_error=0,
-                 ignore_field_error=0):
+                 ignore_field_error=0, batch_size=500, field_batch_size=None, max_concurrent=4):
         """
         response_type: (frame, map) how to return the results
+        batch_size: execute more symbols than this as concurrent sub-requests of this many symbols each, requests
+                    with no more symbols than this are sent as they are (None for a single request however many)
+        field_batch_size: likewise for fields
+        max_concurrent: most sub-requests in flight at once
         """
         assert response_type in ('frame', 'map')
         Request.__init__(self, ignore_security_error=ignore_security_error, ignore_field_error=ignore_field_error)
         self.symbols = isinstance(symbols, str) and [symbols] or symbols
         self.fields = isinstance(fields, str) and [fields] or fields
         self.overrides = overrides or {}
+        self.batch_size = batch_size
+        self.field_batch_size = field_batch_size
+        self.max_concurrent = max_concurrent
         # response related
         self.response = {} if response_type == 'map' else defaultdict(list)
         self.response_type = response_type
+        self.plan = DecoderPlan(self.fields)
+        self.batch_errors = []
 
     def __repr__(self):
         fmtargs = dict(clz=self.__class__.__name__,
@@ -313,7 +522,7 @@ class ReferenceDataRequest(Request):
     def on_security_node(self, node):
         sid = XmlHelper.get_child_value(node, 'security')
         farr = node.GetElement('fieldData')
-        fdata = XmlHelper.get_child_values(farr, self.fields)
+        fdata = self.plan.decode(farr)
         assert len(fdata) == len(self.fields), 'field length must match data length'
         if self.response_type == 'map':
             self.response[sid] = fdata
@@ -334,11 +543,88 @@ class ReferenceDataRequest(Request):
                     self.on_security_node(node)
 
         if is_final and self.response_type == 'frame':
-            index = self.response.pop('security')
+            index = self.response.pop('security', [])
             frame = DataFrame(self.response, columns=self.fields, index=index)
             frame.index.name = 'security'
             self.response = frame
 
+    @staticmethod
+    def split(items, size):
+        """ items in lists of size each (all in one if size is None) """
+        if size is None or len(items) <= size:
+            return [list(items)]
+        return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+    def batches(self):
+        """ (symbols, fields) of each sub-request the request is executed in, the field batches of each symbol batch
+        in turn """
+        return [(symbols, fields) for symbols in self.split(self.symbols, self.batch_size)
+                for fields in self.split(self.fields, self.field_batch_size)]
+
+    def execute(self):
+        """ execute the request, as concurrent sub-requests if there are more symbols or fields than fit in a batch
+
+        a failed batch doesn't stop the others, the response holds everything which came back and the errors of
+        every batch are raised together at the end (BatchError for batches which failed outright)
+        """
+        batches = self.batches()
+        if len(batches) == 1:
+            return Request.execute(self)
+
+        # errors are collected from each batch and raised here, so no batch fails for a bad security or field
+        requests = [ReferenceDataRequest(symbols, fields, overrides=self.overrides, response_type='frame',
+                                         ignore_security_error=1, ignore_field_error=1) for symbols, fields in batches]
+        futures = {}
+        pending = list(range(len(requests)))
+        while pending or futures:
+            while pending and len(futures) < self.max_concurrent:
+                i = pending.pop(0)
+                futures[Terminal.submit_requests([requests[i]])[0]] = i
+            finished, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = futures.pop(future)
+                if future.exception() is not None:
+                    self.batch_errors.append((batches[i][0], batches[i][1], future.exception()))
+
+        # merged in batch order, row by row, so duplicated symbols and their order are kept as for a single request
+        # (the field batches of a symbol batch come back with the same securities in the same order)
+        field_batches = len(self.split(self.fields, self.field_batch_size))
+        index = []
+        columns = dict((f, []) for f in self.fields)
+        for first in range(0, len(requests), field_batches):
+            parts = [r for r in requests[first:first + field_batches] if isinstance(r.response, DataFrame)]
+            if not parts:
+                continue
+            # every field batch reports the same security errors, but each its own field errors
+            self.security_errors.extend(parts[0].security_errors)
+            [self.field_errors.extend(r.field_errors) for r in parts]
+            done = [r.response for r in parts]
+            rows = len(done[0].index)
+            index.extend(done[0].index)
+            filled = set()
+            for frame in done:
+                for f in frame.columns:
+                    columns[f].extend(frame[f].tolist())
+                    filled.add(f)
+            # fields whose batch failed outright
+            for f in self.fields:
+                if f not in filled:
+                    columns[f].extend([np.nan] * rows)
+
+        if self.response_type == 'map':
+            self.response = dict((sid, [columns[f][row] for f in self.fields]) for row, sid in enumerate(index))
+        else:
+            frame = DataFrame(columns, columns=self.fields, index=index)
+            frame.index.name = 'security'
+            self.response = frame
+
+        if self.batch_errors:
+            msgs = ['(%s..%s, %s..%s, %s)' % (symbols[0], symbols[-1], fields[0], fields[-1], e)
+                    for symbols, fields, e in self.batch_errors]
+            raise Exception('BatchError: %s' % ','.join(msgs))
+        self.has_exception and self.raise_exception()
+        return self
+
     @property
     def response_as_series(self):
         """ Return the response as a single series """
@@ -356,9 +642,90 @@ class ReferenceDataRequest(Request):
         return vals
 
 
+class HistoricalBlock(object):
+    def __init__(self, securities, fields, dates=None):
+        """(dates x fields x securities) array which each security's fieldData is written straight into as it arrives,
+        with a row for every date any security has, so the whole response is one block rather than a frame per
+        security to be concatenated and unstacked.
+        Parameters
+        ----------
+        securities : securities requested (kept in sorted order, as unstack would)
+        fields : fields requested
+        dates : expected dates to allocate rows for up front (more are added as they turn up)
+        """
+        self.securities = sorted(securities)
+        self.fields = list(fields)
+        self.columns = dict((sid, j) for j, sid in enumerate(self.securities))
+        self.rows = {}
+        self.dates = []
+        self.received = set()
+        self.values = np.empty((max(len(dates or []), 16), len(self.fields), len(self.securities)))
+        self.values.fill(np.nan)
+        self.used = np.zeros(len(self.values), dtype=bool)
+        [self.row(d) for d in dates or []]
+
+    def row(self, date):
+        """ row of a date, adding one (and growing the block if it is full) for dates not seen before """
+        if date not in self.rows:
+            if len(self.dates) == len(self.values):
+                grown = np.empty((2 * len(self.values),) + self.values.shape[1:], dtype=self.values.dtype)
+                grown.fill(np.nan)
+                grown[:len(self.values)] = self.values
+                self.values = grown
+                self.used = np.concatenate((self.used, np.zeros(len(self.used), dtype=bool)))
+            self.rows[date] = len(self.dates)
+            self.dates.append(date)
+        return self.rows[date]
+
+    def add(self, sid, dates, columns):
+        """ write the fieldData of a security (a list of dates and a list of columns, one per field) """
+        if sid not in self.columns:
+            raise Exception('received data for %s which was not requested' % sid)
+        rows = np.array([self.row(d) for d in dates], dtype=np.int64)
+        try:
+            data = np.array(columns, dtype=self.values.dtype)
+        except (TypeError, ValueError):
+            # not numeric, so everything has to be kept as objects
+            self.values = self.values.astype(object)
+            data = np.array(columns, dtype=object)
+        self.values[rows, :, self.columns[sid]] = data.T.reshape(len(rows), len(self.fields))
+        self.used[rows] = True
+        self.received.add(sid)
+
+    def finish(self):
+        """ sort the dates and drop the dates and securities with no data (the only copy of the block made) """
+        rows = np.nonzero(self.used[:len(self.dates)])[0]
+        rows = rows[np.argsort(to_datetime([self.dates[r] for r in rows]).values, kind='mergesort')]
+        columns = np.array([j for j, sid in enumerate(self.securities) if sid in self.received], dtype=np.int64)
+
+        if len(rows) == len(self.values) and (rows == np.arange(len(rows))).all() \
+                and len(columns) == len(self.securities):
+            values = self.values
+        else:
+            values = np.ascontiguousarray(self.values[rows][:, :, columns])
+
+        self.dates = DatetimeIndex(to_datetime([self.dates[r] for r in rows]), name='date')
+        self.securities = [self.securities[j] for j in columns]
+        self.values = values
+
+    def as_single(self):
+        """ DataFrame with (field, security) columns, a view on the block """
+        columns = MultiIndex.from_product([self.fields, self.securities], names=[None, 'security'])
+        return DataFrame(self.values.reshape(len(self.dates), -1), index=self.dates, columns=columns, copy=False)
+
+    def as_frames(self):
+        """ dict of security to a DataFrame of its fields, each a view on the block """
+        return dict((sid, DataFrame(self.values[:, :, j], index=self.dates, columns=self.fields, copy=False))
+                    for j, sid in enumerate(self.securities))
+
+    def as_panel(self):
+        return Panel(self.values.transpose(2, 0, 1), items=self.securities, major_axis=self.dates,
+                     minor_axis=self.fields)
+
+
 class HistoricalDataRequest(Request):
     def __init__(self, symbols, fields, start=None, end=None, period='DAILY', overrides=None, ignore_security_error=0,
-                 ignore_field_error=0):
+                 ignore_field_error=0, response_type='map'):
         """Historical data request for bbg.
         Parameters
         ----------
@@ -369,9 +736,12 @@ class HistoricalDataRequest(Request):
         period : ('DAILY', 'WEEKLY', 'MONTHLY', 'QUARTERLY', 'SEMI-ANNUAL', 'YEARLY')
         ignore_field_errors : bool
         ignore_security_errors : bool
+        response_type : (map, block) map keeps a DataFrame per security, block writes every security into one
+            preallocated HistoricalBlock, which the responses are views on (for large universes)
         """
         Request.__init__(self, ignore_security_error=ignore_security_error, ignore_field_error=ignore_field_error)
         assert period in ('DAILY', 'WEEKLY', 'MONTHLY', 'QUARTERLY', 'SEMI-ANNUAL', 'YEARLY')
+        assert response_type in ('map', 'block')
         self.symbols = isinstance(symbols, str) and [symbols] or symbols
         self.fields = isinstance(fields, str) and [fields] or fields
         self.overrides = overrides or {}
@@ -384,6 +754,13 @@ class HistoricalDataRequest(Request):
         self.period = period
         # response related
         self.response = {}
+        self.response_type = response_type
+        self.plan = DecoderPlan(['date'] + self.fields)
+        self.block = None
+        if response_type == 'block':
+            # business days are a good guess at the dates of daily data
+            dates = bdate_range(self.start, self.end).date.tolist() if period == 'DAILY' else None
+            self.block = HistoricalBlock(self.symbols, self.fields, dates=dates)
 
     def __repr__(self):
         fmtargs = dict(clz=self.__class__.__name__,
@@ -413,12 +790,11 @@ class HistoricalDataRequest(Request):
         """process a securityData node - FIXME: currently not handling relateDate node """
         sid = XmlHelper.get_child_value(node, 'security')
         farr = node.GetElement('fieldData')
-        dmap = defaultdict(list)
-        for i in range(farr.NumValues):
-            pt = farr.GetValue(i)
-            [dmap[f].append(XmlHelper.get_child_value(pt, f, allow_missing=1)) for f in ['date'] + self.fields]
-        idx = dmap.pop('date')
-        frame = DataFrame(dmap, columns=self.fields, index=idx)
+        values = self.plan.decode_columns(farr)
+        if self.block is not None:
+            self.block.add(sid, values[0], values[1:])
+            return
+        frame = DataFrame(dict(zip(self.fields, values[1:])), columns=self.fields, index=values[0])
         frame.index.name = 'date'
         self.response[sid] = frame
 
@@ -433,8 +809,16 @@ class HistoricalDataRequest(Request):
             else:
                 self.on_security_data_node(node)
 
+        if is_final and self.block is not None:
+            self.block.finish()
+            self.response = self.block.as_frames()
+
     def response_as_single(self, copy=0):
         """ convert the response map to a single data frame with Multi-Index columns """
+        if self.block is not None:
+            frame = self.block.as_single()
+            return frame.copy() if copy else frame
+
         arr = []
 
         for sid, frame in self.response.items():
@@ -449,14 +833,76 @@ class HistoricalDataRequest(Request):
         return concat(arr).unstack()
 
     def response_as_panel(self, swap=False):
-        panel = Panel(self.response)
+        if Panel is None:
+            raise Exception('Panel is not available in this version of pandas, use response_as_single')
+        panel = self.block.as_panel() if self.block is not None else Panel(self.response)
         if swap:
             panel = panel.swapaxes('items', 'minor')
         return panel
 
 
+def days_from_civil(year, month, day):
+    """ days since 1970-01-01 for arrays of (proleptic Gregorian) years, months and days """
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+class BarColumns(object):
+    """ intraday bars kept in typed numpy arrays, which double in size when full, rather than lists of python objects
+
+    each message's bars are copied in with one assignment per array, and timestamps are kept as integer parts
+    which are turned into datetime64 for all the bars at once
+    """
+    # year, month, day, hour, minute, volume, events
+    int_columns = 7
+    # open, high, low, close
+    float_columns = 4
+
+    def __init__(self, capacity=4096):
+        self.size = 0
+        self.ints = np.empty((capacity, self.int_columns), dtype=np.int64)
+        self.floats = np.empty((capacity, self.float_columns), dtype=np.float64)
+
+    def reserve(self, size):
+        if size > len(self.ints):
+            capacity = max(2 * len(self.ints), size)
+            self.ints = np.resize(self.ints, (capacity, self.int_columns))
+            self.floats = np.resize(self.floats, (capacity, self.float_columns))
+
+    def append(self, bars):
+        """ add a barTickData array element """
+        count = bars.NumValues
+        ints, floats = [], []
+        for i in range(count):
+            get = bars.GetValue(i).GetElement
+            ts = get(0).Value
+            ints.append((ts.year, ts.month, ts.day, ts.hour, ts.minute, get(5).Value, get(6).Value))
+            floats.append((get(1).Value, get(2).Value, get(3).Value, get(4).Value))
+
+        if count > 0:
+            self.reserve(self.size + count)
+            self.ints[self.size:self.size + count] = ints
+            self.floats[self.size:self.size + count] = floats
+            self.size += count
+
+    def to_frame(self):
+        """ the bars as a DataFrame indexed by time (the columns are views on the arrays) """
+        ints, floats = self.ints[:self.size], self.floats[:self.size]
+        minutes = (days_from_civil(ints[:, 0], ints[:, 1], ints[:, 2]) * 24 + ints[:, 3]) * 60 + ints[:, 4]
+        index = DatetimeIndex((minutes * 60 * 10 ** 9).view('datetime64[ns]'))
+        columns = {'open': floats[:, 0], 'high': floats[:, 1], 'low': floats[:, 2], 'close': floats[:, 3],
+                   'volume': ints[:, 5], 'events': ints[:, 6]}
+        return DataFrame(columns, columns=['open', 'high', 'low', 'close', 'volume', 'events'], index=index,
+                         copy=False)
+
+
 class IntrdayBarRequest(Request):
-    def __init__(self, symbol, interval, start=None, end=None, event='TRADE'):
+    def __init__(self, symbol, interval, start=None, end=None, event='TRADE', slice_days=None, max_concurrent=4,
+                 on_progress=None):
         """Intraday bar request for bbg
         Parameters
         ----------
@@ -465,6 +911,9 @@ class IntrdayBarRequest(Request):
         start : start date
         end : end date (if None then use today)
         event : (TRADE,BID,ASK,BEST_BID,BEST_ASK)
+        slice_days : execute longer ranges as concurrent requests of this many days each (None for a single request)
+        max_concurrent : most slices in flight at once
+        on_progress : called with (slices done, slices in total, timing of the slice just done) as each slice finishes
         """
         Request.__init__(self)
         assert event in ('TRADE', 'BID', 'ASK', 'BEST_BID', 'BEST_ASK')
@@ -479,8 +928,13 @@ class IntrdayBarRequest(Request):
         self.start = to_datetime(start)
         self.end = to_datetime(end)
         self.event = event
+        self.slice_days = slice_days
+        self.max_concurrent = max_concurrent
+        self.on_progress = on_progress
         # response related
-        self.response = defaultdict(list)
+        self.bars = BarColumns()
+        self.response = None
+        self.slice_timings = []
 
     def __repr__(self):
         fmtargs = dict(clz=self.__class__.__name__,
@@ -510,46 +964,383 @@ class IntrdayBarRequest(Request):
 
     def on_event(self, evt, is_final):
         """ this is invoked from in response to COM PumpWaitingMessages - different thread """
-        response = self.response
         for msg in XmlHelper.message_iter(evt):
-            bars = msg.GetElement('barData').GetElement('barTickData')
-            for i in range(bars.NumValues):
-                bar = bars.GetValue(i)
-                ts = bar.GetElement(0).Value
-                response['time'].append(datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute))
-                response['open'].append(bar.GetElement(1).Value)
-                response['high'].append(bar.GetElement(2).Value)
-                response['low'].append(bar.GetElement(3).Value)
-                response['close'].append(bar.GetElement(4).Value)
-                response['volume'].append(bar.GetElement(5).Value)
-                response['events'].append(bar.GetElement(6).Value)
+            self.bars.append(msg.GetElement('barData').GetElement('barTickData'))
 
         if is_final:
-            idx = response.pop('time')
-            self.response = DataFrame(response, columns=['open', 'high', 'low', 'close', 'volume', 'events'], index=idx)
+            self.response = self.bars.to_frame()
+
+    def slices(self):
+        """ (start, end) of each slice the request is executed in """
+        if self.slice_days is None:
+            return [(self.start, self.end)]
+        step = timedelta(days=self.slice_days)
+        starts = [self.start]
+        while starts[-1] + step < self.end:
+            starts.append(starts[-1] + step)
+        return list(zip(starts, starts[1:] + [self.end]))
+
+    def execute(self):
+        """ execute the request, as concurrent requests of slice_days each if the range is longer than that """
+        slices = self.slices()
+        if len(slices) == 1:
+            return Request.execute(self)
+
+        requests = [IntrdayBarRequest(self.symbol, self.interval, start=start, end=end, event=self.event,
+                                      slice_days=None) for start, end in slices]
+        self.slice_timings = [None] * len(requests)
+        futures = {}
+        pending = list(range(len(requests)))
+        done = 0
+        error = None
+
+        sent = {}
+
+        while (pending and error is None) or futures:
+            while pending and error is None and len(futures) < self.max_concurrent:
+                i = pending.pop(0)
+                sent[i] = time.time()
+                futures[Terminal.submit_requests([requests[i]])[0]] = i
+
+            finished, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = futures.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                else:
+                    # timed here rather than in a done callback, which may not have run yet when wait returns
+                    response = requests[i].response
+                    self.slice_timings[i] = {'start': slices[i][0], 'end': slices[i][1],
+                                             'seconds': time.time() - sent[i],
+                                             'bars': 0 if response is None else len(response.index)}
+                    done += 1
+                    self.on_progress and self.on_progress(done, len(requests), self.slice_timings[i])
+        if error is not None:
+            raise error
+
+        # stitched in order, bars on the boundary between two slices are only kept once
+        frame = concat([r.response for r in requests])
+        self.response = frame[~frame.index.duplicated(keep='first')]
+        return self
+
+class ComTransport(object):
+    """ session layer over the bbg COM API (Windows with a terminal only)
+
+    a transport creates sessions, which look like a blpapicom.ProviderSession mixed in with a ResponseHandler,
+    and pumps their events, so that each event is passed to the session's OnProcessEvent
+    """
+    def create_session(self):
+        if DispatchWithEvents is None:
+            raise Exception('win32com is not installed, set Terminal.transport to a bbg_sim.SimTransport instead')
+        return DispatchWithEvents('blpapicom.ProviderSession.1', ResponseHandler)
+
+    def pump(self, session):
+        """ deliver any waiting events """
+        PumpWaitingMessages()
+
+    def is_alive(self, session):
+        """ health check before a pooled session is reused (pumps first, so any SESSION_STATUS events are in) """
+        PumpWaitingMessages()
+        return session.session_alive
+
+    def init_thread(self):
+        """ prepare a thread (other than the main one) to own sessions """
+        if DispatchWithEvents is None:
+            raise Exception('win32com is not installed, set Terminal.transport to a bbg_sim.SimTransport instead')
+        import pythoncom
+        pythoncom.CoInitialize()
+
+
+class PooledSession(object):
+    """ a started session with the services opened on it """
+    def __init__(self, session):
+        self.session = session
+        self.services = {}
+        self.created = time.time()
+        self.last_used = self.created
+        self.requests = 0
+
+
+class SessionPool(object):
+    def __init__(self, transport, max_idle=4, idle_timeout=300.0):
+        """Long lived sessions shared between requests, so each request doesn't pay for starting a session
+        and opening its service.
+        Parameters
+        ----------
+        transport : ComTransport or bbg_sim.SimTransport
+        max_idle : most sessions kept between requests (0 to stop every session after its request)
+        idle_timeout : seconds a session can go unused before it is stopped
+        """
+        self.transport = transport
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.unhealthy = 0
+
+    def stop(self, pooled):
+        try:
+            pooled.session.Stop()
+        except Exception:
+            pass
+
+    def evict_idle(self):
+        """ stop sessions idle for longer than idle_timeout (call with the lock held) """
+        now = time.time()
+        expired = [p for p in self.idle if now - p.last_used > self.idle_timeout]
+        self.idle = [p for p in self.idle if now - p.last_used <= self.idle_timeout]
+        self.evicted += len(expired)
+        return expired
+
+    def acquire(self):
+        """ take a healthy idle session from the pool, or start a new one """
+        pooled = None
+        with self.lock:
+            expired = self.evict_idle()
+            while self.idle and pooled is None:
+                pooled = self.idle.pop()
+                if not self.transport.is_alive(pooled.session):
+                    self.unhealthy += 1
+                    expired.append(pooled)
+                    pooled = None
+            if pooled is not None:
+                self.reused += 1
+        [self.stop(p) for p in expired]
+
+        if pooled is None:
+            session = self.transport.create_session()
+            session.Start()
+            pooled = PooledSession(session)
+            with self.lock:
+                self.created += 1
+        return pooled
+
+    def get_service(self, pooled, svcname):
+        """ the service svcname on a pooled session, opened the first time it is asked for """
+        if svcname not in pooled.services:
+            if not pooled.session.OpenService(svcname):
+                raise Exception('failed to open service %s' % svcname)
+            pooled.services[svcname] = pooled.session.GetService(svcname)
+        return pooled.services[svcname]
+
+    def release(self, pooled, healthy=True):
+        """ return a session to the pool (sessions which failed are stopped instead) """
+        pooled.last_used = time.time()
+        pooled.requests += 1
+        with self.lock:
+            keep = healthy and len(self.idle) < self.max_idle
+            if keep:
+                self.idle.append(pooled)
+            elif not healthy:
+                self.unhealthy += 1
+            expired = self.evict_idle()
+        keep or self.stop(pooled)
+        [self.stop(p) for p in expired]
+
+    def close(self):
+        """ stop all the idle sessions """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        [self.stop(p) for p in idle]
+
+    def stats(self):
+        with self.lock:
+            return {'created': self.created, 'reused': self.reused, 'idle': len(self.idle),
+                    'evicted': self.evicted, 'unhealthy': self.unhealthy}
+
+
+class RequestPipeline(threading.Thread):
+    def __init__(self, transport):
+        """Thread owning one session, which sends each request submitted to it straight away (without waiting
+        for the responses to earlier ones) and routes the events back to their requests by correlation id
+        Parameters
+        ----------
+        transport : ComTransport or bbg_sim.SimTransport
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.transport = transport
+        self.submitted = queue.Queue()
+        self.in_flight = {}
+        self.stopped = False
+        # set (under lock) once no more requests can be sent, eg. if a session couldn't be started
+        self.error = None
+        self.lock = threading.Lock()
+
+        self.sent = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, request):
+        """ send a request, returns a Future which resolves to the request once its response is in """
+        future = Future()
+        with self.lock:
+            if self.stopped or self.error is not None:
+                future.set_exception(self.error or Exception('pipeline has been stopped'))
+            else:
+                self.submitted.put((request, future))
+        return future
+
+    def start_session(self):
+        self.session = self.transport.create_session()
+        self.session.Start()
+        self.session.do_init_many()
+        self.services = {}
+
+    def send(self, request, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            svcname = request.get_bbg_service_name()
+            if svcname not in self.services:
+                if not self.session.OpenService(svcname):
+                    raise Exception('failed to open service %s' % svcname)
+                self.services[svcname] = self.session.GetService(svcname)
+            asbbg = request.get_bbg_request(self.services[svcname], self.session)
+            correlation_id = self.session.SendRequest(asbbg)
+            self.session.add_handler(correlation_id, request)
+            self.in_flight[id(request)] = future
+            self.sent += 1
+        except Exception as e:
+            self.failed += 1
+            future.set_exception(e)
+
+    def resolve(self, request, exc_info):
+        future = self.in_flight.pop(id(request))
+        try:
+            if exc_info:
+                raise exc_info[1].with_traceback(exc_info[2])
+            request.has_exception and request.raise_exception()
+            self.completed += 1
+            future.set_result(request)
+        except Exception as e:
+            self.failed += 1
+            future.set_exception(e)
+
+    def fail_in_flight(self, e):
+        for future in self.in_flight.values():
+            self.failed += 1
+            future.set_exception(e)
+        self.in_flight = {}
+
+    def close(self, e):
+        """ fail the requests in flight and waiting to be sent with e, and any submitted afterwards """
+        with self.lock:
+            self.error = e
+        self.fail_in_flight(e)
+        while not self.submitted.empty():
+            self.failed += 1
+            self.submitted.get()[1].set_exception(e)
+
+    def run(self):
+        try:
+            self.transport.init_thread()
+            self.start_session()
+        except Exception as e:
+            self.close(e)
+            return
+        while not self.stopped:
+            try:
+                # wait for work when there is nothing in flight, otherwise only take what has been submitted
+                block = len(self.in_flight) == 0
+                while True:
+                    try:
+                        request, future = self.submitted.get(block, 0.1)
+                    except queue.Empty:
+                        break
+                    self.send(request, future)
+                    block = False
+
+                if self.in_flight:
+                    self.transport.pump(self.session)
+                    # eg. the session going down
+                    self.session.has_deferred_exception and self.session.raise_deferred_exception()
+                    for request, exc_info in self.session.take_completed():
+                        self.resolve(request, exc_info)
+            except Exception as e:
+                # the session has failed, so start again with a new one
+                self.fail_in_flight(e)
+                try:
+                    self.session.Stop()
+                except Exception:
+                    pass
+                try:
+                    self.start_session()
+                except Exception as e:
+                    self.close(e)
+                    return
+
+        self.close(Exception('pipeline has been stopped'))
+        self.session.Stop()
+
+    def stop(self):
+        self.stopped = True
+        self.join()
+
+    def stats(self):
+        return {'sent': self.sent, 'in_flight': len(self.in_flight), 'completed': self.completed, 'failed': self.failed}
+
 
 class Terminal(object):
+    # set to a bbg_sim.SimTransport to run requests without a terminal
+    transport = ComTransport()
+
+    # sessions are kept for reuse by later requests (set max_idle_sessions to 0 for a session per request)
+    max_idle_sessions = 4
+    idle_timeout = 300.0
+    pool = None
+
+    @classmethod
+    def session_pool(cls):
+        """ the SessionPool for the current transport """
+        if cls.pool is None or cls.pool.transport is not cls.transport:
+            cls.pool and cls.pool.close()
+            cls.pool = SessionPool(cls.transport, max_idle=cls.max_idle_sessions, idle_timeout=cls.idle_timeout)
+        return cls.pool
+
+    @classmethod
+    def close_sessions(cls):
+        cls.pool and cls.pool.close()
+        cls.pool = None
+        cls.pipeline and cls.pipeline.stop()
+        cls.pipeline = None
+
+    pipeline = None
+
+    @classmethod
+    def submit_requests(cls, requests):
+        """ send many requests at once on one session, returns a list of Futures (one for each request) """
+        if cls.pipeline is None or cls.pipeline.transport is not cls.transport or not cls.pipeline.is_alive():
+            cls.pipeline and cls.pipeline.stop()
+            cls.pipeline = RequestPipeline(cls.transport)
+            cls.pipeline.start()
+        return [cls.pipeline.submit(r) for r in requests]
+
     @classmethod
     def execute_request(cls, request):
-        session = DispatchWithEvents('blpapicom.ProviderSession.1', ResponseHandler)
-        session.Start()
+        pool = cls.session_pool()
+        pooled = pool.acquire()
+        session = pooled.session
+        healthy = False
         try:
-            svcname = request.get_bbg_service_name()
-            if not session.OpenService(svcname):
-                raise Exception('failed to open service %s' % svcname)
-
-            svc = session.GetService(svcname)
+            svc = pool.get_service(pooled, request.get_bbg_service_name())
             asbbg = request.get_bbg_request(svc, session)
             session.SendRequest(asbbg)
             session.do_init(request)
             while session.waiting:
-                PumpWaitingMessages()
+                cls.transport.pump(session)
+            # a handler which failed part way through may leave events behind, so don't reuse the session
+            healthy = not session.has_deferred_exception
             session.has_deferred_exception and session.raise_deferred_exception()
             request.has_exception and request.raise_exception()
             return request
         finally:
-            session.Stop()
             session.do_cleanup()
+            pool.release(pooled, healthy)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,523 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# In-process simulator of the bbg COM API, so that bbg_com requests can be run and benchmarked without
+# a terminal (eg. on Linux)
+#
+# eg. Terminal.transport = SimTransport(latency = 0.05)
+#     HistoricalDataRequest(['EURUSD Curncy'], ['PX_LAST']).execute()
+#
+# sessions answer ReferenceDataRequest, HistoricalDataRequest and IntradayBarRequest with PARTIAL_RESPONSE
+# and RESPONSE events holding elements shaped like the real ones (securityData, fieldData, barTickData),
+# with made up (but repeatable) values
+
+# for scheduling events
+import heapq
+import itertools
+import time
+
+# for made up data
+import datetime
+import zlib
+import numpy
+import pandas
+
+from bbg_com import ResponseHandler, SESSION_STATUS, RESPONSE, PARTIAL_RESPONSE
+
+# bbg element datatypes
+BOOL, INT32, INT64, FLOAT64, STRING, DATE, DATETIME, SEQUENCE = 1, 4, 5, 7, 8, 10, 13, 15
+
+class SimElement(object):
+    # SimElement - element of a simulated request or message, with the parts of the COM Element interface
+    # that bbg_com uses
+    #
+
+    def __init__(self, name, datatype = SEQUENCE, value = None, is_array = False):
+        # name = element name
+        # datatype = bbg datatype (SEQUENCE for elements with children)
+        # value = value of a scalar element
+        # is_array = whether the element holds an array of values
+        #
+
+        self.Name = name
+        self.Datatype = datatype
+        self.Value = value
+        self.IsArray = is_array
+
+        self.values = []
+        self.elements = []
+        self.children = {}
+
+    # building elements
+    def add(self, name, datatype = SEQUENCE, value = None, is_array = False):
+        child = SimElement(name, datatype, value, is_array)
+
+        self.elements.append(child)
+        self.children[name] = child
+
+        return child
+
+    # COM Element interface
+    @property
+    def NumValues(self):
+        return len(self.values) if self.IsArray else 1
+
+    @property
+    def NumElements(self):
+        return len(self.elements)
+
+    def HasElement(self, name):
+        return name in self.children
+
+    def GetElement(self, name):
+        if isinstance(name, int):
+            return self.elements[name]
+
+        if name not in self.children:
+            raise Exception('Element %s has no child %s' % (self.Name, name))
+
+        return self.children[name]
+
+    def GetValue(self, index = 0):
+        if isinstance(index, str):
+            return self.GetElement(index).Value
+
+        return self.values[index] if self.IsArray else self.Value
+
+    def AppendValue(self, value):
+        self.values.append(value)
+
+    def AppendElment(self):
+        # (sic) as called by Request.apply_overrides
+        element = SimElement(self.Name)
+        self.values.append(element)
+
+        return element
+
+    def Set(self, name, value):
+        if name in self.children:
+            self.children[name].Value = value
+        else:
+            self.add(name, STRING, value)
+
+    SetElement = Set
+
+    @property
+    def Print(self):
+        return self.to_string(0)
+
+    def to_string(self, indent):
+        pad = '    ' * indent
+
+        if self.IsArray:
+            values = [v.to_string(indent + 1) if isinstance(v, SimElement) else pad + '    ' + str(v)
+                      for v in self.values]
+
+            return pad + self.Name + '[] = {\n' + '\n'.join(values) + '\n' + pad + '}'
+
+        if self.Datatype == SEQUENCE:
+            return pad + self.Name + ' = {\n' + '\n'.join([e.to_string(indent + 1) for e in self.elements]) \
+                   + '\n' + pad + '}'
+
+        return pad + self.Name + ' = ' + str(self.Value)
+
+class SimMessage(object):
+    # SimMessage - message within a simulated event
+    #
+
+    def __init__(self, element, correlation_id):
+        self.AsElement = element
+        self.MessageTypeAsString = element.Name
+        self.CorrelationId = correlation_id
+
+    def GetElement(self, name):
+        return self.AsElement.GetElement(name)
+
+    @property
+    def Print(self):
+        return self.AsElement.Print
+
+class SimMessageIterator(object):
+    def __init__(self, messages):
+        self.messages = iter(messages)
+        self.Message = None
+
+    def Next(self):
+        self.Message = next(self.messages, None)
+
+        return self.Message is not None
+
+class SimEvent(object):
+    # SimEvent - PARTIAL_RESPONSE or RESPONSE event holding one or more messages
+    #
+
+    def __init__(self, event_type, messages):
+        self.EventType = event_type
+        self.messages = messages
+
+    def CreateMessageIterator(self):
+        return SimMessageIterator(self.messages)
+
+class SimService(object):
+    def __init__(self, name):
+        self.Name = name
+
+    def CreateRequest(self, operation):
+        request = SimElement(operation)
+
+        for name in ['securities', 'fields', 'overrides']:
+            request.add(name, STRING, is_array = True)
+
+        return request
+
+class SimSession(ResponseHandler):
+    # SimSession - simulated blpapicom.ProviderSession (mixed in with the ResponseHandler like DispatchWithEvents does)
+    #
+    # SendRequest works out the whole response straight away, and schedules its events to arrive after the
+    # transport's latency, pump delivers the events which are due to OnProcessEvent on the calling thread
+    #
+
+    services = ['//blp/refdata']
+
+    def __init__(self, transport):
+        self.transport = transport
+
+        self.started = False
+        self.opened = {}
+        self.scheduled = []
+        self.sequence = itertools.count()
+
+        self.waiting = False
+        self.exc_info = None
+        self.handler = None
+
+        self.requests = 0
+        self.events = 0
+
+    def Start(self):
+        time.sleep(self.transport.start_latency)
+        self.started = True
+
+        return True
+
+    def Stop(self):
+        self.started = False
+        self.opened = {}
+        self.scheduled = []
+
+    def terminate(self, status = 'SessionTerminated'):
+        # terminate - the session goes down, as if the terminal had gone away
+        #
+        # status = SESSION_STATUS message type to send (eg. 'SessionConnectionDown')
+        #
+
+        event = SimEvent(SESSION_STATUS, [SimMessage(SimElement(status), None)])
+        heapq.heappush(self.scheduled, (time.time(), next(self.sequence), event))
+
+    def OpenService(self, name):
+        if not self.started or name not in self.services:
+            return False
+
+        time.sleep(self.transport.service_latency)
+        self.opened[name] = SimService(name)
+
+        return True
+
+    def GetService(self, name):
+        if name not in self.opened:
+            raise Exception('Service %s has not been opened' % name)
+
+        return self.opened[name]
+
+    def CreateDatetime(self, year, month, day, hour = 0, minute = 0):
+        return datetime.datetime(year, month, day, hour, minute)
+
+    def SendRequest(self, request, correlation_id = None):
+        # SendRequest - sends a request, returns its correlation id (set on every message of the response)
+        #
+
+        if not self.started:
+            raise Exception('Session has not been started')
+
+        if correlation_id is None:
+            correlation_id = next(self.sequence)
+
+        self.requests = self.requests + 1
+
+        responder = {'ReferenceDataRequest': self.reference_data,
+                     'HistoricalDataRequest': self.historical_data,
+                     'IntradayBarRequest': self.intraday_bars}[request.Name]
+
+        if self.transport.responses is None:
+            elements = responder(request)
+        else:
+            # the made up data only depends on the request, so identical requests can share the response
+            key = request.Print
+
+            if key not in self.transport.responses:
+                self.transport.responses[key] = responder(request)
+
+            elements = self.transport.responses[key]
+
+        due = time.time() + self.transport.latency
+
+        for i in range(0, len(elements)):
+            event_type = RESPONSE if i == len(elements) - 1 else PARTIAL_RESPONSE
+            event = SimEvent(event_type, [SimMessage(elements[i], correlation_id)])
+
+            heapq.heappush(self.scheduled, (due, next(self.sequence), event))
+
+            due = due + self.transport.message_interval
+
+        return correlation_id
+
+    def cast_event(self, evt):
+        return evt
+
+    def correlation_key(self, correlation_id):
+        return correlation_id
+
+    def pump(self):
+        # pump - delivers the events which are due, or if none are, waits (briefly) for the next one
+        #
+
+        if len(self.scheduled) == 0: return
+
+        wait = self.scheduled[0][0] - time.time()
+
+        if wait > 0:
+            time.sleep(min(wait, 0.01))
+
+        now = time.time()
+
+        while len(self.scheduled) > 0 and self.scheduled[0][0] <= now:
+            evt = heapq.heappop(self.scheduled)[2]
+
+            self.events = self.events + 1
+            self.OnProcessEvent(evt)
+
+    # made up responses
+    def random_walk(self, key, n, start = 100.0, vol = 0.01):
+        rng = numpy.random.RandomState(zlib.crc32(key.encode('utf-8')) & 0xffffffff)
+
+        return start * numpy.exp(numpy.cumsum(rng.normal(0, vol, n)))
+
+    def add_error(self, parent, name, category, message):
+        error = parent.add(name)
+
+        for child, value in [('source', 'sim'), ('code', -1), ('category', category), ('message', message),
+                             ('subcategory', category)]:
+            error.add(child, STRING if isinstance(value, str) else INT32, value)
+
+        return error
+
+    def add_security_data(self, parent, security, sequence_number):
+        node = parent.add('securityData')
+        node.add('security', STRING, security)
+        node.add('sequenceNumber', INT32, sequence_number)
+
+        return node
+
+    def reference_data(self, request):
+        # securityData[] in messages of securities_per_message securities each
+        #
+
+        securities = request.GetElement('securities').values
+        fields = request.GetElement('fields').values
+        per_message = self.transport.securities_per_message
+
+        if self.transport.max_securities is not None and len(securities) > self.transport.max_securities:
+            element = SimElement('ReferenceDataResponse')
+            self.add_error(element, 'responseError', 'LIMIT', 'Request has more than %d securities'
+                           % self.transport.max_securities)
+
+            return [element]
+
+        elements = []
+
+        for first in range(0, max(len(securities), 1), per_message):
+            element = SimElement('ReferenceDataResponse')
+            array = element.add('securityData', is_array = True)
+
+            for i in range(first, min(first + per_message, len(securities))):
+                security = securities[i]
+                node = self.add_security_data(SimElement('securityData'), security, i)
+                array.values.append(node)
+
+                if security.upper().startswith('BAD'):
+                    self.add_error(node, 'securityError', 'BAD_SEC', 'Unknown/Invalid security')
+                    continue
+
+                exceptions = node.add('fieldExceptions', is_array = True)
+                field_data = node.add('fieldData')
+
+                for field in fields:
+                    if field.upper().startswith('BAD'):
+                        field_exception = SimElement('fieldExceptions')
+                        field_exception.add('fieldId', STRING, field)
+                        self.add_error(field_exception, 'errorInfo', 'BAD_FLD', 'Field not valid')
+                        exceptions.values.append(field_exception)
+                    elif 'NAME' in field.upper():
+                        field_data.add(field, STRING, security.split(' ')[0] + ' ' + field)
+                    else:
+                        field_data.add(field, FLOAT64, float(self.random_walk(security + field, 1)[0]))
+
+            elements.append(element)
+
+        return elements
+
+    # business days between each point for each periodicity
+    period_days = {'DAILY': 1, 'WEEKLY': 5, 'MONTHLY': 21, 'QUARTERLY': 63, 'SEMI-ANNUAL': 126, 'YEARLY': 252}
+
+    def historical_data(self, request):
+        # one securityData (with a fieldData[] row per date) per message
+        #
+
+        securities = request.GetElement('securities').values
+        fields = request.GetElement('fields').values
+
+        start = pandas.Timestamp(request.GetElement('startDate').Value)
+        end = pandas.Timestamp(request.GetElement('endDate').Value)
+        period = request.GetElement('periodicitySelection').Value if request.HasElement('periodicitySelection') \
+            else 'DAILY'
+
+        dates = pandas.bdate_range(start, end)[::-self.period_days[period]][::-1].to_pydatetime()
+
+        elements = []
+
+        for i in range(0, len(securities)):
+            security = securities[i]
+            element = SimElement('HistoricalDataResponse')
+            node = self.add_security_data(element, security, i)
+
+            if security.upper().startswith('BAD'):
+                self.add_error(node, 'securityError', 'BAD_SEC', 'Unknown/Invalid security')
+            else:
+                node.add('fieldExceptions', is_array = True)
+                rows = node.add('fieldData', is_array = True)
+
+                values = [self.random_walk(security + field, len(dates)) for field in fields]
+
+                for j in range(0, len(dates)):
+                    row = SimElement('fieldData')
+                    row.add('date', DATE, dates[j].date())
+
+                    for k in range(0, len(fields)):
+                        row.add(fields[k], FLOAT64, float(values[k][j]))
+
+                    rows.values.append(row)
+
+            elements.append(element)
+
+        return elements
+
+    def intraday_bars(self, request):
+        # barData.barTickData[] in messages of bars_per_message bars each, on weekdays only
+        #
+
+        security = request.GetElement('security').Value
+        interval = int(request.GetElement('interval').Value)
+
+        start = request.GetElement('startDateTime').Value
+        end = request.GetElement('endDateTime').Value
+
+        if security.upper().startswith('BAD'):
+            element = SimElement('IntradayBarResponse')
+            self.add_error(element, 'responseError', 'BAD_SEC', 'Unknown/Invalid security')
+
+            return [element]
+
+        # each day's bars are made up from that day alone, so the same bar comes back however the range is split
+        times, open, close, volume = [], [], [], []
+
+        for day in pandas.date_range(start.date(), end.date()).to_pydatetime():
+            if day.weekday() >= 5: continue
+
+            rng = numpy.random.RandomState(zlib.crc32((security + day.strftime('%Y%m%d')).encode('utf-8')))
+
+            day_close = (1.0 + rng.uniform(-0.1, 0.1)) * numpy.exp(numpy.cumsum(rng.normal(0, 0.0002, 1440 // interval)))
+            day_open = numpy.concatenate((day_close[0:1], day_close[:-1]))
+            day_volume = rng.randint(0, 1000, len(day_close))
+
+            for i in range(0, len(day_close)):
+                t = day + datetime.timedelta(minutes = interval * i)
+
+                if start <= t < end:
+                    times.append(t)
+                    open.append(day_open[i])
+                    close.append(day_close[i])
+                    volume.append(day_volume[i])
+
+        per_message = self.transport.bars_per_message
+        elements = []
+
+        for first in range(0, max(len(times), 1), per_message):
+            element = SimElement('IntradayBarResponse')
+            bars = element.add('barData').add('barTickData', is_array = True)
+
+            for i in range(first, min(first + per_message, len(times))):
+                bar = SimElement('barTickData')
+
+                bar.add('time', DATETIME, times[i])
+                bar.add('open', FLOAT64, float(open[i]))
+                bar.add('high', FLOAT64, float(max(open[i], close[i]) * 1.0001))
+                bar.add('low', FLOAT64, float(min(open[i], close[i]) * 0.9999))
+                bar.add('close', FLOAT64, float(close[i]))
+                bar.add('volume', INT64, int(volume[i]))
+                bar.add('numEvents', INT32, int(volume[i] // 10))
+                bar.add('value', FLOAT64, float(close[i] * volume[i]))
+
+                bars.values.append(bar)
+
+            elements.append(element)
+
+        return elements
+
+class SimTransport(object):
+    # SimTransport - transport for bbg_com.Terminal which creates SimSessions
+    #
+
+    def __init__(self, latency = 0.05, message_interval = 0.0, start_latency = 0.0, service_latency = 0.0,
+                 securities_per_message = 10, bars_per_message = 5000, cache_responses = False, max_securities = None):
+        # latency = seconds from sending a request to its first event
+        # message_interval = seconds between the events of a response
+        # start_latency = seconds to start a session
+        # service_latency = seconds to open a service
+        # securities_per_message = securityData per ReferenceDataRequest message
+        # bars_per_message = barTickData per IntradayBarRequest message
+        # cache_responses = keep the made up responses, so repeating a request doesn't make them up again
+        #                   (for benchmarking the client side only)
+        # max_securities = most securities a ReferenceDataRequest may have (None for no limit)
+        #
+
+        self.latency = latency
+        self.message_interval = message_interval
+        self.start_latency = start_latency
+        self.service_latency = service_latency
+        self.securities_per_message = securities_per_message
+        self.bars_per_message = bars_per_message
+        self.responses = {} if cache_responses else None
+        self.max_securities = max_securities
+
+        self.sessions_created = 0
+
+    def create_session(self):
+        self.sessions_created = self.sessions_created + 1
+
+        return SimSession(self)
+
+    def pump(self, session):
+        session.pump()
+
+    def is_alive(self, session):
+        # deliver any SESSION_STATUS events first, as pumping a COM session does
+        session.pump()
+
+        return session.started and session.session_alive
+
+    def init_thread(self):
+        pass
@@ -0,0 +1,709 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for timing
+import datetime
+import heapq
+import time
+
+# for temporary files
+import os
+import shutil
+import tempfile
+
+# for time series/maths
+import math
+import numpy
+import pandas
+
+# for memory use
+import tracemalloc
+
+# for plotting
+import json
+import plotly
+
+# for data downloading
+from datadownloader import DataDownloader
+from stubs import StubDataSource, write_synthetic_csv
+
+# for converting to plotly traces
+from plothelper import PlotHelper
+
+# for Bloomberg requests (against the simulator)
+import bbg_com
+from bbg_sim import SimTransport
+
+# for realised vol calculations
+from volcalculator import VolCalculator, ChunkedRealisedVol
+
+csv_file = 'EURUSD.csv' # sample intraday data shipped alongside this script
+
+def timeit(func, repeat = 3):
+    # timeit - best wall clock time of calling func over a number of runs
+    #
+    # func = function with no arguments to time
+    # repeat = number of runs
+    #
+
+    best = None
+
+    for i in range(0, repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+
+        if best is None or elapsed < best: best = elapsed
+
+    return best
+
+def banner(msg):
+    print('*' * 25)
+    print(msg)
+    print('*' * 25)
+
+def bench_csv_parse():
+    # bench_csv_parse - rows/second loading the intraday CSV for both supported date layouts
+    #
+
+    banner('Intraday CSV parsing: sniffed vectorised dates vs strptime per row')
+
+    data_downloader = DataDownloader()
+
+    # write a copy of the sample data with the day first layout
+    spot = pandas.read_csv(csv_file, index_col = 0, parse_dates = True)
+    dayfirst_file = os.path.join(tempfile.mkdtemp(), 'EURUSD-dayfirst.csv')
+    spot.to_csv(dayfirst_file, date_format = '%d/%m/%Y %H:%M:%S')
+
+    rows = len(spot.index)
+
+    for date_format, f in [('%Y-%m-%d %H:%M:%S', csv_file), ('%d/%m/%Y %H:%M:%S', dayfirst_file)]:
+        # the way the dates were parsed before: strptime on each row
+        def strptime_per_row(f = f, date_format = date_format):
+            spot = pandas.read_csv(f, index_col = 0)
+            spot.index = pandas.DatetimeIndex([datetime.datetime.strptime(x, date_format) for x in spot.index])
+
+            return spot
+
+        old = timeit(strptime_per_row)
+        new = timeit(lambda: data_downloader.read_csv(f, data_downloader.intraday_date_formats))
+
+        print('%s: strptime %.0f rows/s, vectorised %.0f rows/s (%.1fx)' %
+              (date_format, rows / old, rows / new, old / new))
+
+    os.remove(dayfirst_file)
+
+def bench_vol_multi_freq():
+    # bench_vol_multi_freq - realised vol at several minute frequencies: joined loop vs single pass
+    #
+
+    banner('Realised vol at 1, 5, 10, 30, 60 mins: loop with outer joins vs realised_vol_multi_freq')
+
+    spot = DataDownloader().read_csv(csv_file, DataDownloader.intraday_date_formats)
+    minute_freq = [1, 5, 10, 30, 60]
+
+    # the loop vol_study used to run
+    def joined_loop():
+        realised_vol = None
+
+        for min in minute_freq:
+            spot_min = spot.loc[spot.index.minute % min == 0]
+            rets = spot_min / spot_min.shift(1) - 1
+            realised_vol_min = rets.rolling(int(1440.0 / min)).std() * math.sqrt(252.0 * (1440.0 / min)) * 100
+            realised_vol_min.columns = [str(min) + 'min']
+            if realised_vol is None: realised_vol = realised_vol_min
+            else:
+                realised_vol = realised_vol.join(realised_vol_min, how = 'outer')
+
+        return realised_vol
+
+    vol_calculator = VolCalculator()
+
+    old = timeit(joined_loop)
+    new = timeit(lambda: vol_calculator.realised_vol_multi_freq(spot, minute_freq))
+
+    print('%d rows: joined loop %.3fs, single pass %.3fs (%.1fx)' % (len(spot.index), old, new, old / new))
+
+def bench_plot_encoding():
+    # bench_plot_encoding - encode time and payload size of convert_df_plotly traces: JSON lists vs binary
+    #
+
+    banner('Encoding realised vol traces: JSON lists vs base64 typed arrays, with and without a shared x')
+
+    spot = DataDownloader().read_csv(csv_file, DataDownloader.intraday_date_formats)
+    realised_vol = VolCalculator().realised_vol_multi_freq(spot, [1, 5, 10, 30, 60])
+
+    plot_helper = PlotHelper()
+
+    for label, kwargs, share in [('json', {}, False), ('json shared x', {}, True),
+                                 ('binary f8', {'encoding': 'binary', 'binary_dtype': 'f8'}, False),
+                                 ('binary f4', {'encoding': 'binary', 'binary_dtype': 'f4'}, False),
+                                 ('binary f4 shared x', {'encoding': 'binary', 'binary_dtype': 'f4'}, True)]:
+        def encode(kwargs = kwargs, share = share):
+            traces = plot_helper.convert_df_plotly(realised_vol, **kwargs)
+
+            return json.dumps(plot_helper.share_x(traces) if share else traces, cls = plotly.utils.PlotlyJSONEncoder)
+
+        elapsed = timeit(encode)
+
+        print('%s: %.3fs, %d bytes' % (label, elapsed, len(encode())))
+
+def bench_download_many(tickers = 16, latency = 0.25):
+    # bench_download_many - wall clock of downloading a universe one ticker at a time vs download_many
+    #
+    # tickers = size of the universe
+    # latency = seconds each download takes from the stub source
+    #
+
+    banner('Downloading %d tickers (stub source, %.2fs latency): serial vs download_many' % (tickers, latency))
+
+    data_downloader = DataDownloader(sources = {'Stub': StubDataSource(latency = latency)})
+    DataDownloader.max_concurrent = dict(DataDownloader.max_concurrent, Stub = 8)   # before the first Stub download
+
+    universe = [('T' + str(i), 'Ticker ' + str(i)) for i in range(0, tickers)]
+    start_date = datetime.datetime(2014, 1, 1)
+
+    def serial():
+        return [data_downloader.download_time_series(t[0], t[1], start_date, 'Stub') for t in universe]
+
+    old = timeit(serial, repeat = 1)
+    new = timeit(lambda: data_downloader.download_many(universe, start_date, 'Stub'), repeat = 1)
+
+    print('serial %.2fs, download_many %.2fs (%.1fx)' % (old, new, old / new))
+
+def bench_csv_range(rows = 3000000, days = 120):
+    # bench_csv_range - loading the last few months of a multi-year minute history: reading everything and filtering
+    # vs pushing the date range into the CSV reader and the store
+    #
+    # rows = minutes of synthetic history
+    # days = length of the window to load
+    #
+
+    banner('Loading the last %d days of %d minutes: read all and filter vs date range pushdown' % (days, rows))
+
+    data_downloader = DataDownloader()
+    big_file = write_synthetic_csv(rows)
+
+    finish_date = datetime.datetime(2005, 1, 1) + datetime.timedelta(minutes = rows - 1)
+    start_date = finish_date - datetime.timedelta(days = days)
+
+    def read_all():
+        spot = data_downloader.read_csv(big_file, data_downloader.intraday_date_formats)
+
+        return spot.loc[spot.index >= start_date]
+
+    def read_range(source):
+        return data_downloader.download_time_series('EURUSD', 'EURUSD', start_date, source, csv_file = big_file,
+                                                    freq = 'intraday', finish_date = finish_date)
+
+    # build the store first, so only loading is timed
+    read_range('store')
+
+    old = timeit(read_all, repeat = 1)
+    csv = timeit(lambda: read_range('CSV'))
+    store = timeit(lambda: read_range('store'))
+
+    if not read_all().equals(read_range('CSV')) or not numpy.array_equal(read_all().values, read_range('store').values):
+        raise Exception('Date range reads differ from reading everything and filtering')
+
+    print('%d rows in range: read all %.3fs, CSV range %.3fs (%.1fx), store range %.4fs (%.1fx)' %
+          (len(read_range('CSV').index), old, csv, old / csv, store, old / store))
+
+    os.remove(big_file)
+    shutil.rmtree(big_file + '.store')
+
+def bench_chunked_memory(rows = 3000000, chunksize = 100000):
+    # bench_chunked_memory - peak memory of realised vol over a synthetic minute CSV read in chunks vs reading the
+    # whole file in one go (test_volcalculator checks the chunked pass stays under a ceiling on a smaller file)
+    #
+    # rows = minutes of synthetic history to write
+    # chunksize = rows per chunk
+    #
+
+    banner('Chunked realised vol over %d rows: peak memory' % rows)
+
+    data_downloader = DataDownloader()
+    minute_freq = [1, 5, 10, 30, 60]
+
+    big_file = write_synthetic_csv(rows, chunksize)
+
+    print('%s: %.0fMB on disk' % (big_file, os.path.getsize(big_file) / 1e6))
+
+    # keep only the last vol of each chunk, so the output doesn't grow with the file
+    def chunked():
+        chunked_vol = ChunkedRealisedVol(minute_freq)
+        last_vol = None
+
+        for spot in data_downloader.download_time_series('EURUSD', 'EURUSD', None, 'CSV', csv_file = big_file,
+                                                         freq = 'intraday', chunksize = chunksize):
+            last_vol = chunked_vol.realised_vol(spot).iloc[-1]
+
+        return last_vol
+
+    tracemalloc.start()
+    start = time.time()
+    chunked_last = chunked()
+    elapsed = time.time() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('chunked: %.2fs (%.0f rows/s), peak %.1fMB' % (elapsed, rows / elapsed, peak / 1e6))
+
+    tracemalloc.start()
+    start = time.time()
+    spot = data_downloader.read_csv(big_file, data_downloader.intraday_date_formats)
+    whole_last = VolCalculator().realised_vol_multi_freq(spot, minute_freq).iloc[-1]
+    elapsed = time.time() - start
+    del spot
+    current, whole_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('whole file: %.2fs, peak %.1fMB' % (elapsed, whole_peak / 1e6))
+
+    os.remove(big_file)
+
+    if not numpy.allclose(chunked_last.values, whole_last.values, rtol = 1e-9, equal_nan = True):
+        raise Exception('Chunked realised vol ' + str(chunked_last.values) + ' differs from '
+                        + str(whole_last.values))
+
+def bench_bbg_parsing(securities = 500, fields = 10, days = 365 * 5, bar_days = 30):
+    # bench_bbg_parsing - cells/second parsed by the bbg_com requests from simulated events (with no latency)
+    #
+    # securities = universe size for the reference and historical requests
+    # fields = fields per security
+    # days = calendar days of daily history
+    # bar_days = calendar days of 1 minute bars
+    #
+
+    banner('Parsing simulated bbg responses: ReferenceDataRequest, HistoricalDataRequest, IntrdayBarRequest')
+
+    transport = SimTransport(latency = 0)
+    old_transport, bbg_com.Terminal.transport = bbg_com.Terminal.transport, transport
+
+    universe = ['SEC%d Equity' % i for i in range(0, securities)]
+    field_list = ['FLD%d' % i for i in range(0, fields)]
+    finish_date = datetime.datetime(2015, 6, 1)
+
+    try:
+        for label, make, cells in [
+            ('ReferenceDataRequest', lambda: bbg_com.ReferenceDataRequest(universe, field_list),
+             lambda r: r.response.size),
+            ('HistoricalDataRequest', lambda: bbg_com.HistoricalDataRequest(universe[0:50], field_list,
+                start = finish_date - datetime.timedelta(days = days), end = finish_date),
+             lambda r: sum([f.size for f in r.response.values()])),
+            ('IntrdayBarRequest', lambda: bbg_com.IntrdayBarRequest('EURUSD Curncy', 1,
+                start = finish_date - datetime.timedelta(days = bar_days), end = finish_date),
+             lambda r: r.response.size)]:
+
+            # time pumping and parsing only, not working out the simulated response
+            session = transport.create_session()
+            session.Start()
+            session.OpenService('//blp/refdata')
+
+            request = make()
+            session.SendRequest(request.get_bbg_request(session.GetService('//blp/refdata'), session))
+            session.do_init(request)
+
+            start = time.time()
+
+            while session.waiting:
+                transport.pump(session)
+
+            elapsed = time.time() - start
+
+            session.has_deferred_exception and session.raise_deferred_exception()
+
+            print('%s: %d cells in %.3fs (%.0f cells/s)' % (label, cells(request), elapsed, cells(request) / elapsed))
+    finally:
+        bbg_com.Terminal.transport = old_transport
+
+def bench_bbg_session_pool(requests = 50, start_latency = 0.05, service_latency = 0.02, latency = 0.005):
+    # bench_bbg_session_pool - per request time of small requests with a new session per request vs pooled sessions
+    #
+    # requests = number of requests sent one after another
+    # start_latency, service_latency = seconds to start a simulated session and open its service
+    # latency = seconds from sending a request to its response
+    #
+
+    banner('%d small ReferenceDataRequests: session per request vs pooled sessions' % requests)
+
+    old_transport = bbg_com.Terminal.transport
+    old_max_idle = bbg_com.Terminal.max_idle_sessions
+
+    def run():
+        for i in range(0, requests):
+            bbg_com.ReferenceDataRequest(['SEC%d Equity' % i], ['PX_LAST']).execute()
+
+    try:
+        for label, max_idle in [('session per request', 0), ('pooled', 4)]:
+            bbg_com.Terminal.transport = SimTransport(latency = latency, start_latency = start_latency,
+                                                      service_latency = service_latency)
+            bbg_com.Terminal.max_idle_sessions = max_idle
+            bbg_com.Terminal.close_sessions()
+
+            elapsed = timeit(run, repeat = 1)
+
+            print('%s: %.1fms per request (%.1fms of it latency), %s' %
+                  (label, elapsed / requests * 1000, latency * 1000, str(bbg_com.Terminal.pool.stats())))
+    finally:
+        bbg_com.Terminal.close_sessions()
+        bbg_com.Terminal.transport = old_transport
+        bbg_com.Terminal.max_idle_sessions = old_max_idle
+
+def bench_bbg_pipelining(securities = 400, batch_size = 50, latency = 0.2, message_interval = 0.002):
+    # bench_bbg_pipelining - universe wide HistoricalDataRequest split into batches: sent one after another vs
+    # all submitted at once on one session
+    #
+    # securities = universe size
+    # batch_size = securities per request
+    # latency = seconds from sending a request to its first event
+    # message_interval = seconds between the events (one per security) of a response
+    #
+
+    banner('HistoricalDataRequest for %d securities in batches of %d: serial vs pipelined' % (securities, batch_size))
+
+    old_transport, bbg_com.Terminal.transport = bbg_com.Terminal.transport, \
+        SimTransport(latency = latency, message_interval = message_interval, cache_responses = True)
+
+    universe = ['SEC%d Equity' % i for i in range(0, securities)]
+    finish_date = datetime.datetime(2015, 6, 1)
+
+    def batches():
+        return [bbg_com.HistoricalDataRequest(universe[i:i + batch_size], ['PX_LAST'],
+                                              start = finish_date - datetime.timedelta(days = 365), end = finish_date)
+                for i in range(0, securities, batch_size)]
+
+    try:
+        # make up the responses before timing
+        [f.result() for f in bbg_com.Terminal.submit_requests(batches())]
+
+        old = timeit(lambda: [r.execute() for r in batches()], repeat = 1)
+        new = timeit(lambda: [f.result() for f in bbg_com.Terminal.submit_requests(batches())], repeat = 1)
+
+        slowest = latency + (batch_size - 1) * message_interval
+
+        print('serial %.2fs, pipelined %.2fs (%.1fx), slowest batch on its own %.2fs' % (old, new, old / new, slowest))
+    finally:
+        bbg_com.Terminal.close_sessions()
+        bbg_com.Terminal.transport = old_transport
+
+def bench_bbg_intraday_bars(days = 90):
+    # bench_bbg_intraday_bars - IntrdayBarRequest of 1 minute bars: python lists and datetimes per bar (as it was)
+    # vs typed numpy columns
+    #
+    # days = calendar days of bars
+    #
+
+    banner('IntrdayBarRequest, %d days of 1 minute bars: lists of python objects vs typed columns' % days)
+
+    class ListBarRequest(bbg_com.IntrdayBarRequest):
+        # the way bars were accumulated before BarColumns
+        def on_event(self, evt, is_final):
+            response = self.response = self.response if self.response is not None else {}
+
+            for msg in bbg_com.XmlHelper.message_iter(evt):
+                bars = msg.GetElement('barData').GetElement('barTickData')
+
+                for i in range(bars.NumValues):
+                    bar = bars.GetValue(i)
+                    ts = bar.GetElement(0).Value
+                    response.setdefault('time', []).append(
+                        datetime.datetime(ts.year, ts.month, ts.day, ts.hour, ts.minute))
+
+                    for name, j in [('open', 1), ('high', 2), ('low', 3), ('close', 4), ('volume', 5), ('events', 6)]:
+                        response.setdefault(name, []).append(bar.GetElement(j).Value)
+
+            if is_final:
+                idx = response.pop('time')
+                self.response = pandas.DataFrame(response, columns = ['open', 'high', 'low', 'close', 'volume', 'events'],
+                                                 index = idx)
+
+    transport = SimTransport(latency = 0)
+    finish_date = datetime.datetime(2015, 6, 1)
+
+    def run(request_class, trace):
+        request = request_class('EURUSD Curncy', 1, start = finish_date - datetime.timedelta(days = days),
+                                end = finish_date)
+
+        session = transport.create_session()
+        session.Start()
+        session.OpenService('//blp/refdata')
+        session.SendRequest(request.get_bbg_request(session.GetService('//blp/refdata'), session))
+        session.do_init(request)
+
+        # time pumping and parsing only, not working out the simulated response (memory is traced in a separate
+        # run, as tracing slows down allocation)
+        if trace: tracemalloc.start()
+        start = time.time()
+
+        while session.waiting:
+            transport.pump(session)
+
+        elapsed = time.time() - start
+
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        session.has_deferred_exception and session.raise_deferred_exception()
+
+        return request.response, peak if trace else elapsed
+
+    old, old_time = run(ListBarRequest, False)
+    new, new_time = run(bbg_com.IntrdayBarRequest, False)
+    old_peak = run(ListBarRequest, True)[1]
+    new_peak = run(bbg_com.IntrdayBarRequest, True)[1]
+
+    if not old.equals(new):
+        raise Exception('Typed columns give a different frame to python lists')
+
+    print('%d bars: lists %.3fs (peak %.1fMB), typed columns %.3fs (peak %.1fMB), %.1fx' %
+          (len(new.index), old_time, old_peak / 1e6, new_time, new_peak / 1e6, old_time / new_time))
+
+def bench_bbg_sliced_bars(days = 120, slice_days = 10, latency = 0.2, message_interval = 0.05):
+    # bench_bbg_sliced_bars - 1 minute bars over a long range as one request vs concurrent slices
+    #
+    # days = calendar days of bars (volstudy loads 120)
+    # slice_days = days per slice
+    # latency = seconds from sending a request to its first event
+    # message_interval = seconds between the events of a response (the server streaming a big response)
+    #
+
+    banner('IntrdayBarRequest for %d days of 1 minute bars: one request vs %d day slices' % (days, slice_days))
+
+    old_transport, bbg_com.Terminal.transport = bbg_com.Terminal.transport, \
+        SimTransport(latency = latency, message_interval = message_interval, bars_per_message = 1000,
+                     cache_responses = True)
+
+    finish_date = datetime.datetime(2015, 6, 1)
+    start_date = finish_date - datetime.timedelta(days = days)
+
+    def request(slice_days, on_progress = None):
+        return bbg_com.IntrdayBarRequest('EURUSD Curncy', 1, start = start_date, end = finish_date,
+                                         slice_days = slice_days, on_progress = on_progress).execute()
+
+    def progress(done, total, timing):
+        print('  slice %d/%d: %s to %s, %d bars in %.2fs' %
+              (done, total, timing['start'].date(), timing['end'].date(), timing['bars'], timing['seconds']))
+
+    try:
+        # make up the responses before timing
+        request(None)
+        request(slice_days)
+
+        old = timeit(lambda: request(None), repeat = 1)
+        new = timeit(lambda: request(slice_days, progress), repeat = 1)
+
+        if not request(None).response.equals(request(slice_days).response):
+            raise Exception('Sliced bars differ from a single request')
+
+        print('one request %.2fs, slices %.2fs (%.1fx)' % (old, new, old / new))
+    finally:
+        bbg_com.Terminal.close_sessions()
+        bbg_com.Terminal.transport = old_transport
+
+def bench_bbg_decoding(securities = 1000, fields = 50, days = 365):
+    # bench_bbg_decoding - decoding simulated securityData: HasElement/GetElement and a datatype dispatch per cell
+    # (as it was) vs a DecoderPlan compiled once per request
+    #
+    # securities = securities in the ReferenceDataRequest response
+    # fields = fields per security (every tenth one a string)
+    # days = calendar days of daily history for the HistoricalDataRequest response
+    #
+
+    banner('Decoding %d securities x %d fields: per cell dispatch vs compiled decoder plan' % (securities, fields))
+
+    transport = SimTransport(latency = 0, securities_per_message = 100)
+    session = transport.create_session()
+    session.Start()
+    session.OpenService('//blp/refdata')
+    service = session.GetService('//blp/refdata')
+
+    universe = ['SEC%d Equity' % i for i in range(0, securities)]
+    field_list = [('NAME%d' if i % 10 == 0 else 'FLD%d') % i for i in range(0, fields)]
+    finish_date = datetime.datetime(2015, 6, 1)
+
+    def messages(request):
+        session.SendRequest(request.get_bbg_request(service, session))
+        events = [heapq.heappop(session.scheduled)[2] for i in range(0, len(session.scheduled))]
+
+        return [m for e in events for m in e.messages]
+
+    # fieldData of every security in the reference response, fieldData[] of every security in the historical one
+    reference = [node.GetElement('fieldData') for m in messages(bbg_com.ReferenceDataRequest(universe, field_list))
+                 for node in m.GetElement('securityData').values]
+    historical = [m.GetElement('securityData').GetElement('fieldData') for m in messages(
+        bbg_com.HistoricalDataRequest(universe[0:50], field_list[0:10],
+                                      start = finish_date - datetime.timedelta(days = days), end = finish_date))]
+
+    XmlHelper = bbg_com.XmlHelper
+
+    def reference_old():
+        return [XmlHelper.get_child_values(node, field_list) for node in reference]
+
+    def reference_new():
+        plan = bbg_com.DecoderPlan(field_list)
+
+        return [plan.decode(node) for node in reference]
+
+    def historical_old():
+        return [[[XmlHelper.get_child_value(farr.GetValue(i), f, allow_missing = 1) for i in range(farr.NumValues)]
+                 for f in ['date'] + field_list[0:10]] for farr in historical]
+
+    def historical_new():
+        plan = bbg_com.DecoderPlan(['date'] + field_list[0:10])
+
+        return [plan.decode_columns(farr) for farr in historical]
+
+    for label, old, new, cells in [
+        ('ReferenceDataRequest', reference_old, reference_new, securities * fields),
+        ('HistoricalDataRequest', historical_old, historical_new,
+         sum([farr.NumValues for farr in historical]) * 11)]:
+
+        if old() != new():
+            raise Exception(label + ' decoder plan gives different values')
+
+        old_time = timeit(old)
+        new_time = timeit(new)
+
+        print('%s: %d cells, per cell %.0f cells/s, plan %.0f cells/s (%.1fx)' %
+              (label, cells, cells / old_time, cells / new_time, old_time / new_time))
+
+def bench_bbg_historical_block(securities = 2000, fields = 3, days = 365):
+    # bench_bbg_historical_block - universe wide HistoricalDataRequest into response_as_single: a frame per security
+    # concatenated and unstacked vs one preallocated block
+    #
+    # securities = universe size
+    # fields = fields per security
+    # days = calendar days of daily history
+    #
+
+    banner('HistoricalDataRequest for %d securities x %d fields: frame per security vs block' % (securities, fields))
+
+    transport = SimTransport(latency = 0)
+
+    universe = ['SEC%d Equity' % i for i in range(0, securities)]
+    field_list = ['FLD%d' % i for i in range(0, fields)]
+    finish_date = datetime.datetime(2015, 6, 1)
+
+    def run(response_type, trace):
+        request = bbg_com.HistoricalDataRequest(universe, field_list, start = finish_date - datetime.timedelta(days = days),
+                                                end = finish_date, response_type = response_type)
+
+        session = transport.create_session()
+        session.Start()
+        session.OpenService('//blp/refdata')
+        session.SendRequest(request.get_bbg_request(session.GetService('//blp/refdata'), session))
+        session.do_init(request)
+
+        # time pumping, parsing and building the single frame, not working out the simulated response
+        # (memory is traced in a separate run, as tracing slows down allocation)
+        if trace: tracemalloc.start()
+        start = time.time()
+
+        while session.waiting:
+            transport.pump(session)
+
+        single = request.response_as_single()
+
+        elapsed = time.time() - start
+
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        session.has_deferred_exception and session.raise_deferred_exception()
+
+        return single, peak if trace else elapsed
+
+    old, old_time = run('map', False)
+    new, new_time = run('block', False)
+    old_peak = run('map', True)[1]
+    new_peak = run('block', True)[1]
+
+    if not numpy.array_equal(old.values, new.values, equal_nan = True):
+        raise Exception('Block gives a different frame to concatenating frames')
+
+    print('%s cells: frames %.2fs (peak %.0fMB), block %.2fs (peak %.0fMB), %.1fx' %
+          (new.size, old_time, old_peak / 1e6, new_time, new_peak / 1e6, old_time / new_time))
+
+def bench_bbg_reference_batches(securities = 5000, batch_size = 500, max_securities = 1000, latency = 0.2,
+                                message_interval = 0.002):
+    # bench_bbg_reference_batches - universe wide ReferenceDataRequest: one request vs batches one after another
+    # vs batches in flight at once
+    #
+    # securities = universe size (the last one a bad security)
+    # batch_size = securities per sub-request
+    # max_securities = most securities the simulator takes in a request
+    # latency = seconds from sending a request to its first event
+    # message_interval = seconds between the events (10 securities each) of a response
+    #
+
+    banner('ReferenceDataRequest for %d securities in batches of %d: serial vs concurrent' % (securities, batch_size))
+
+    transport = SimTransport(latency = latency, message_interval = message_interval, cache_responses = True,
+                             max_securities = max_securities)
+    old_transport, bbg_com.Terminal.transport = bbg_com.Terminal.transport, transport
+
+    universe = ['SEC%d Equity' % i for i in range(0, securities - 1)] + ['BAD Equity']
+    field_list = ['NAME', 'PX_LAST', 'PX_OPEN', 'PX_HIGH', 'PX_LOW']
+
+    def run(**kwargs):
+        request = bbg_com.ReferenceDataRequest(universe, field_list, ignore_security_error = 1, **kwargs)
+
+        return request.execute().response
+
+    try:
+        try:
+            run(batch_size = None)
+        except Exception as e:
+            print('single request: ' + str(e))
+
+        # make up the responses before timing
+        run(batch_size = batch_size)
+
+        old = timeit(lambda: run(batch_size = batch_size, max_concurrent = 1), repeat = 1)
+        new = timeit(lambda: run(batch_size = batch_size, max_concurrent = 4), repeat = 1)
+
+        # a single request of the whole universe to check against (on a simulator without the limit)
+        bbg_com.Terminal.close_sessions()
+        bbg_com.Terminal.transport = SimTransport(latency = 0)
+
+        whole = run(batch_size = None)
+        batched = run(batch_size = batch_size, field_batch_size = 2)
+
+        if not whole.equals(batched):
+            raise Exception('Batches give a different frame to a single request')
+
+        # without ignore_security_error the bad security is raised, after everything else has come back
+        request = bbg_com.ReferenceDataRequest(universe, field_list, batch_size = batch_size)
+
+        try:
+            request.execute()
+        except Exception as e:
+            print('%d securities back, %s' % (len(request.response.index), str(e)))
+
+        print('serial %.2fs, concurrent %.2fs (%.1fx)' % (old, new, old / new))
+    finally:
+        bbg_com.Terminal.close_sessions()
+        bbg_com.Terminal.transport = old_transport
+
+if __name__ == '__main__':
+    bench_csv_parse()
+    bench_vol_multi_freq()
+    bench_plot_encoding()
+    bench_download_many()
+    bench_chunked_memory()
+    bench_csv_range()
+    bench_bbg_parsing()
+    bench_bbg_session_pool()
+    bench_bbg_pipelining()
+    bench_bbg_intraday_bars()
+    bench_bbg_sliced_bars()
+    bench_bbg_decoding()
+    bench_bbg_historical_block()
+    bench_bbg_reference_batches()
@@ -0,0 +1,96 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for threading
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import traceback
+
+class CoalescingPool:
+    # CoalescingPool - runs jobs on a bounded thread pool, at most one at a time per key (eg. per client session)
+    #
+    # if a job is submitted for a key which already has one running, it waits as that key's pending job,
+    # replacing (dropping) any job which was already pending, so only the latest state per key is computed
+    #
+
+    def __init__(self, max_workers = 4):
+        # max_workers = number of threads doing the work
+        #
+
+        self.executor = ThreadPoolExecutor(max_workers = max_workers)
+        self.lock = threading.Lock()
+
+        self.running = set()
+        self.pending = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.superseded = 0
+        self.failed = 0
+
+    def submit(self, key, func, *args):
+        # submit - runs func(*args) for key, or holds it until the running job for key finishes
+        #
+        # key = hashable key which jobs are coalesced on
+        # func = function to run
+        # args = arguments for func
+        #
+
+        with self.lock:
+            self.submitted = self.submitted + 1
+
+            if key in self.running:
+                if key in self.pending:
+                    self.superseded = self.superseded + 1
+
+                self.pending[key] = (func, args)
+
+                return
+
+            self.running.add(key)
+
+        self.executor.submit(self.run, key, func, args)
+
+    def run(self, key, func, args):
+        # run - runs a job on a worker thread, then queues the pending job for key (if any) behind other keys' jobs
+        #
+
+        try:
+            func(*args)
+
+            with self.lock: self.completed = self.completed + 1
+        except Exception:
+            with self.lock: self.failed = self.failed + 1
+
+            traceback.print_exc()
+
+        with self.lock:
+            job = self.pending.pop(key, None)
+
+            if job is None:
+                self.running.discard(key)
+
+                return
+
+        self.executor.submit(self.run, key, job[0], job[1])
+
+    def stats(self):
+        # stats - job counters as a dict
+        #
+
+        with self.lock:
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'superseded': self.superseded,
+                'failed': self.failed,
+                'running': len(self.running),
+                'pending': len(self.pending)
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait = True)
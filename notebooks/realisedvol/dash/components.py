@@ -32,3 +32,62 @@ def graph(id):
         src="https://plot.ly/~playground/7.embed",
         style="width: 100%; height: 500px; border: none;"
     ))
+
+
+# Decodes plot messages whenever they are parsed:
+# - {"dtype": ..., "bdata": ...} base64 typed arrays become JS typed arrays,
+#   for plotly.js versions which can't read them directly
+# - {"$ref": name} fields in a message's "data" traces are replaced by
+#   the array stored once under that name in the message's "shared" table
+PLOT_DATA_DECODER = '''
+(function() {
+    var types = {
+        'f8': Float64Array, 'f4': Float32Array,
+        'i4': Int32Array, 'u4': Uint32Array,
+        'i2': Int16Array, 'u2': Uint16Array,
+        'i1': Int8Array, 'u1': Uint8Array
+    };
+
+    function decode(value) {
+        var raw = atob(value.bdata);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        return new types[value.dtype](bytes.buffer);
+    }
+
+    function resolve(message) {
+        message.data.forEach(function(trace) {
+            for (var key in trace) {
+                var value = trace[key];
+                if (value && typeof value === 'object' &&
+                        typeof value['$ref'] === 'string') {
+                    trace[key] = message.shared[value['$ref']];
+                }
+            }
+        });
+        delete message.shared;
+        return message;
+    }
+
+    var parse = JSON.parse;
+    JSON.parse = function(text, reviver) {
+        return parse(text, function(key, value) {
+            if (value && typeof value === 'object') {
+                if (typeof value.bdata === 'string' && types[value.dtype]) {
+                    value = decode(value);
+                } else if (value.shared && Array.isArray(value.data)) {
+                    value = resolve(value);
+                }
+            }
+            return reviver ? reviver.call(this, key, value) : value;
+        });
+    };
+})();
+'''
+
+
+def plot_data_decoder():
+    return element('script', {'type': 'text/javascript'},
+                   PLOT_DATA_DECODER)
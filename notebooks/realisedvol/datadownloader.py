@@ -6,12 +6,59 @@ __author__ = 'saeedamen'
 """
 
 # for time series manipulation
+import numpy
 import pandas
-import pandas.io.data as web
+
+try:
+    import pandas.io.data as web
+except ImportError:
+    # moved out of pandas into pandas_datareader, only needed for Yahoo daily downloads
+    try:
+        import pandas_datareader.data as web
+    except ImportError:
+        web = None
 
 import datetime
 
+# for reading date ranges out of CSV files
+import io
+import mmap
+
+# for parallel downloads
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 class DataDownloader:
+    # date layouts we accept in the first column of CSV files (sniffed from the first rows)
+    daily_date_formats = ['%Y-%m-%d', '%d/%m/%Y']
+    intraday_date_formats = ['%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S']
+
+    # number of rows used to sniff the date layout
+    sniff_rows = 100
+
+    # most downloads in flight at once per source in download_many (the COM Bloomberg API isn't thread safe), read when
+    # the source's thread pool is started
+    max_concurrent = {'Bloomberg': 1, 'Quandl': 2, 'Yahoo': 4}
+    default_max_concurrent = 4
+
+    # intraday Bloomberg ranges longer than this many days are downloaded as concurrent slices of this many days
+    # (None to always make a single request)
+    bloomberg_slice_days = 30
+
+    # thread pool per source, shared by every download_many call (from any thread or instance), so
+    # max_concurrent holds across callers rather than within each call
+    executors = {}
+    executors_lock = threading.Lock()
+
+    def __init__(self, cache = None, sources = None):
+        # cache = TimeSeriesCache which daily downloads are kept in (None to always download everything)
+        # sources = dict of extra sources by name, objects with a
+        #           download_time_series(vendor_ticker, pretty_ticker, start_date, freq) method (eg. stubs.StubDataSource)
+        #
+
+        self.cache = cache
+        self.sources = sources or {}
+
     def download_live_quote(self, vendor_ticker, source):
         if source == 'Yahoo':
             from urllib2 import urlopen
@@ -24,45 +71,85 @@ class DataDownloader:
 
         return price
 
+    def download_live_quotes(self, vendor_tickers, source, url = None):
+        # download_live_quotes - gets quotes for many tickers at once, concurrently over keep-alive connections
+        #
+        # vendor_tickers = list of vendor tickers
+        # source = 'Yahoo'
+        # url = quotes.csv endpoint (eg. a StubQuoteServer's url when offline)
+        #
+        # returns a dict of ticker to Quote (price, date, time, change, open, high, low, volume); for
+        # continuous polling with subscribers, use quoteservice.LiveQuoteService directly
+        #
+        # if an event loop is already running in this thread (as it is in Jupyter/IPython), the quotes are got on
+        # a loop of their own on a worker thread, inside a coroutine await download_live_quotes_async instead
+        #
+
+        import asyncio
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.download_live_quotes_async(vendor_tickers, source, url = url))
+
+        with ThreadPoolExecutor(max_workers = 1) as executor:
+            return executor.submit(asyncio.run, self.download_live_quotes_async(vendor_tickers, source, url = url)) \
+                .result()
+
+    async def download_live_quotes_async(self, vendor_tickers, source, url = None):
+        # download_live_quotes_async - as download_live_quotes, awaited on the running event loop
+        #
+
+        from quoteservice import LiveQuoteService
+
+        if source == 'Yahoo':
+            service = LiveQuoteService(vendor_tickers, url = url or 'http://finance.yahoo.com/d/quotes.csv')
+
+            try:
+                return await service.poll_once()
+            finally:
+                service.pool.close()
+
     def download_time_series(self, vendor_ticker, pretty_ticker, start_date, source, csv_file = None,
-                             freq = 'daily', freq_no = 1):
+                             freq = 'daily', freq_no = 1, finish_date = None, chunksize = None):
+        # download_time_series - downloads daily or intraday data from a source
+        #
+        # start_date = first date to download (None for the whole history)
+        # finish_date = last date to download (None for up to the latest data)
+        # chunksize = for 'CSV', returns an iterator of frames of this many rows rather than one frame (for histories
+        #             too big for memory, eg. to feed volcalculator.ChunkedRealisedVol)
+        #
+        # for 'CSV' and 'store' only the rows between start_date and finish_date are read
+        #
+
         if not(isinstance(start_date, list)):
             start_date = [start_date]
 
-        if freq == 'daily':
-            if source == 'Quandl':
-                import Quandl
-                # Quandl requires API key for large number of daily downloads
-                # https://www.quandl.com/help/api
-                spot = Quandl.get(vendor_ticker)    # Bank of England's database on Quandl
-                spot = pandas.DataFrame(data = spot['Value'], index = spot.index)
-                spot.columns = [pretty_ticker]
-            elif source == 'Yahoo':
-                finish_date = datetime.datetime.utcnow()
-                finish_date = datetime.datetime(finish_date.year, finish_date.month, finish_date.day, 0, 0, 0)
-
-                spot = web.DataReader(vendor_ticker, 'yahoo', start_date[0], finish_date)
-                spot = pandas.DataFrame(data = spot['Close'].values, index = spot.index, columns = [pretty_ticker])
+        if chunksize is not None:
+            if source != 'CSV':
+                raise Exception('chunksize is only supported for CSV, not ' + str(source))
 
-                spot.index = pandas.DatetimeIndex(spot.index)
+            return self.iterate_csv(csv_file, self.daily_date_formats if freq == 'daily' else self.intraday_date_formats,
+                                    chunksize = chunksize, start_date = start_date[0], finish_date = finish_date)
 
-            elif source == 'Bloomberg':
-                from egthalesians.plotly.helper.bbg_com import HistoricalDataRequest
-                req = HistoricalDataRequest([vendor_ticker], ['PX_LAST'], start = start_date[0])
-                req.execute()
-
-                spot = req.response_as_single()
+        if freq == 'daily':
+            if self.cache is not None and source != 'CSV':
+                # only download the dates we don't already have on disk
+                spot = self.cache.fetch((source, vendor_ticker, freq), start_date[0],
+                                        lambda start: self.download_daily(vendor_ticker, pretty_ticker, start, source))
                 spot.columns = [pretty_ticker]
-            elif source == 'CSV':
-                dateparse = lambda x: pandas.datetime.strptime(x, '%Y-%m-%d')
+            else:
+                spot = self.download_daily(vendor_ticker, pretty_ticker, start_date[0], source, csv_file = csv_file,
+                                           finish_date = finish_date)
 
-                # in case you want to use a source other than Bloomberg/Quandl
-                spot = pandas.read_csv(csv_file, index_col=0, parse_dates=0, date_parser=dateparse)
+            if finish_date is not None and source != 'CSV':
+                spot = spot.loc[spot.index <= pandas.Timestamp(finish_date)]
 
         elif freq == 'intraday':
             if source == 'Bloomberg':
-                from egthalesians.plotly.helper.bbg_com import IntrdayBarRequest
-                req = IntrdayBarRequest(vendor_ticker, freq_no, start = start_date[0])
+                from bbg_com import IntrdayBarRequest
+                req = IntrdayBarRequest(vendor_ticker, freq_no, start = start_date[0], end = finish_date,
+                                        slice_days = self.bloomberg_slice_days)
 
                 req.execute()
 
@@ -73,13 +160,329 @@ class DataDownloader:
                                         index = spot.index, columns = [pretty_ticker + ".close"])
 
             elif source == 'CSV':
-                dateparse = lambda x: pandas.datetime.strptime(x, '%Y-%m-%d %H:%M:%S')
-
                 # in case you want to use a source other than Bloomberg/Quandl etc
+                spot = self.read_csv(csv_file, self.intraday_date_formats, start_date = start_date[0],
+                                     finish_date = finish_date)
+
+            elif source == 'store':
+                from tickstore import TickStore
+
+                # parse the CSV only the first time (or when it has changed), afterwards memory map the binary copy
+                store = TickStore()
+
+                if store.is_stale(csv_file):
+                    spot = self.download_time_series(vendor_ticker, pretty_ticker, None, 'CSV',
+                                                     csv_file = csv_file, freq = freq, freq_no = freq_no)
+                    store.write(csv_file, spot)
+
+                spot = store.read(csv_file, start_date = start_date[0], finish_date = finish_date)
+
+        return spot
+
+    @classmethod
+    def source_executor(cls, source):
+        # source_executor - the thread pool downloads from source run on, started the first time it is needed
+        #
+
+        with cls.executors_lock:
+            if source not in cls.executors:
+                cls.executors[source] = ThreadPoolExecutor(
+                    max_workers = cls.max_concurrent.get(source, cls.default_max_concurrent))
+
+            return cls.executors[source]
+
+    def download_many(self, tickers, start_date, source = None, csv_file = None, freq = 'daily', freq_no = 1):
+        # download_many - downloads many tickers in parallel, on a thread pool per source, into one aligned frame
+        #
+        # tickers = list of (vendor_ticker, pretty_ticker) or (vendor_ticker, pretty_ticker, source)
+        # start_date = first date to download
+        # source = source for tickers which don't give their own
+        # csv_file, freq, freq_no = as for download_time_series
+        #
+        # returns (frame, info) where frame has a column per ticker which downloaded (outer joined on dates)
+        # and info maps each pretty_ticker to its source, elapsed seconds, rows and error (None if it worked)
+        #
+
+        import time
+
+        by_source = {}
+
+        for t in tickers:
+            by_source.setdefault(t[2] if len(t) > 2 else source, []).append(t)
+
+        def download(vendor_ticker, pretty_ticker, ticker_source):
+            start = time.time()
+
+            try:
+                spot = self.download_time_series(vendor_ticker, pretty_ticker, start_date, ticker_source,
+                                                 csv_file = csv_file, freq = freq, freq_no = freq_no)
+                error = None
+            except Exception as e:
+                spot = None
+                error = str(e)
+
+            return spot, {'vendor_ticker': vendor_ticker, 'source': ticker_source, 'elapsed': time.time() - start,
+                          'rows': 0 if spot is None else len(spot.index), 'error': error}
+
+        futures = []
+
+        for ticker_source, source_tickers in by_source.items():
+            executor = self.source_executor(ticker_source)
+
+            futures.extend([(t[1], executor.submit(download, t[0], t[1], ticker_source)) for t in source_tickers])
+
+        frames = []; info = {}
+
+        for pretty_ticker, future in futures:
+            spot, info[pretty_ticker] = future.result()
+
+            if spot is not None: frames.append(spot)
+
+        # a single outer join of everything
+        frame = pandas.concat(frames, axis = 1) if len(frames) > 0 else pandas.DataFrame()
+
+        return frame, info
+
+    def download_daily(self, vendor_ticker, pretty_ticker, start_date, source, csv_file = None, finish_date = None):
+        # download_daily - downloads daily data from a source (without going through the cache)
+        #
+        # vendor_ticker = ticker used by the source
+        # pretty_ticker = column name for the data
+        # start_date = first date to download
+        # source = 'Quandl', 'Yahoo', 'Bloomberg', 'CSV' or one of the sources passed to the constructor
+        # csv_file = path of the CSV file (for 'CSV')
+        # finish_date = last date to download (for 'Yahoo' and 'CSV')
+        #
+
+        if source in self.sources:
+            spot = self.sources[source].download_time_series(vendor_ticker, pretty_ticker, start_date, 'daily')
+        elif source == 'Quandl':
+            import Quandl
+            # Quandl requires API key for large number of daily downloads
+            # https://www.quandl.com/help/api
+            if start_date is None:
+                spot = Quandl.get(vendor_ticker)    # Bank of England's database on Quandl
+            else:
+                spot = Quandl.get(vendor_ticker, trim_start = start_date)
+            spot = pandas.DataFrame(data = spot['Value'], index = spot.index)
+            spot.columns = [pretty_ticker]
+        elif source == 'Yahoo':
+            if finish_date is None:
+                finish_date = datetime.datetime.utcnow()
+                finish_date = datetime.datetime(finish_date.year, finish_date.month, finish_date.day, 0, 0, 0)
+
+            if web is None:
+                raise Exception('Yahoo downloads need pandas_datareader (or a pandas with pandas.io.data)')
+
+            spot = web.DataReader(vendor_ticker, 'yahoo', start_date, finish_date)
+            spot = pandas.DataFrame(data = spot['Close'].values, index = spot.index, columns = [pretty_ticker])
+
+            spot.index = pandas.DatetimeIndex(spot.index)
+
+        elif source == 'Bloomberg':
+            from bbg_com import HistoricalDataRequest
+            req = HistoricalDataRequest([vendor_ticker], ['PX_LAST'], start = start_date)
+            req.execute()
+
+            spot = req.response_as_single()
+            spot.columns = [pretty_ticker]
+        elif source == 'CSV':
+            # in case you want to use a source other than Bloomberg/Quandl
+            spot = self.read_csv(csv_file, self.daily_date_formats, start_date = start_date, finish_date = finish_date)
+
+        return spot
+
+    def sniff_date_format(self, str_dates, date_formats):
+        # sniff_date_format - picks the layout which parses the most dates in a sample
+        #
+        # str_dates = sample of dates as strings
+        # date_formats = candidate strptime layouts, in order of preference
+        #
+
+        best_format = None; best_count = 0
+
+        for date_format in date_formats:
+            count = 0
+
+            for d in str_dates:
                 try:
-                    spot = pandas.read_csv(csv_file, index_col = 0, parse_dates = 0, date_parser = dateparse)
-                except:
-                    dateparse = lambda x: pandas.datetime.strptime(x, '%d/%m/%Y %H:%M:%S')
-                    spot = pandas.read_csv(csv_file, index_col = 0, parse_dates = 0, date_parser = dateparse)
+                    datetime.datetime.strptime(d, date_format)
+                    count = count + 1
+                except (TypeError, ValueError):
+                    pass
+
+            if count > best_count:
+                best_format = date_format; best_count = count
+
+        if best_format is None:
+            raise Exception('None of the date formats ' + str(date_formats) + ' match ' + str(list(str_dates[0:5])))
+
+        return best_format
+
+    def read_csv(self, csv_file, date_formats, start_date = None, finish_date = None):
+        # read_csv - reads a CSV file with dates in the first column, parsing all dates in one vectorised pass
+        #
+        # csv_file = path of the CSV file
+        # date_formats = candidate strptime layouts for the dates (sniffed from the first rows)
+        # start_date, finish_date = only read rows between these dates (None for no limit)
+        #
+        # rows whose dates don't match the sniffed layout are reported and dropped
+        #
+        # when a date range is given the file must be sorted by date: the range is found by binary search on
+        # byte offsets, and only the rows inside it are read and parsed
+        #
+
+        if start_date is None and finish_date is None:
+            spot = pandas.read_csv(csv_file, index_col = 0)
+
+            date_format = self.sniff_date_format(spot.index.values[0:self.sniff_rows], date_formats)
+
+            return self.parse_date_index(spot, date_format, csv_file)
+
+        date_format = self.sniff_date_format(
+            pandas.read_csv(csv_file, index_col = 0, nrows = self.sniff_rows).index.values, date_formats)
+
+        with open(csv_file, 'rb') as f:
+            if len(f.readline()) == 0:
+                raise Exception('Empty CSV file ' + str(csv_file))
+
+            mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+            try:
+                data_start = mm.find(b'\n') + 1 or len(mm)
+                lo, hi = data_start, len(mm)
+
+                if start_date is not None:
+                    lo = self.csv_offset(mm, lo, hi, pandas.Timestamp(start_date).to_pydatetime(), date_format, False)
+
+                if finish_date is not None:
+                    hi = self.csv_offset(mm, lo, hi, pandas.Timestamp(finish_date).to_pydatetime(), date_format, True)
+
+                text = mm[0:data_start] + mm[lo:hi]
+            finally:
+                mm.close()
+
+        spot = pandas.read_csv(io.BytesIO(text), index_col = 0)
+
+        return self.parse_date_index(spot, date_format, csv_file, first_row = None, first_byte = lo)
+
+    def csv_offset(self, mm, lo, hi, date, date_format, after):
+        # csv_offset - binary search for the byte offset of the first line dated on/after date (or after date)
+        #
+        # mm = memory map of a CSV file sorted by the dates in its first column
+        # lo, hi = byte offsets of line starts to search between
+        # date = datetime to search for
+        # date_format = strptime layout of the dates
+        # after = find the first line dated strictly after date (otherwise on or after)
+        #
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            # start of the line holding mid (lines which don't parse are compared by the next one which does)
+            line_start = mm.rfind(b'\n', lo, mid) + 1 or lo
+
+            next_start = line_start
+            line_date = None
+
+            while line_date is None and next_start < hi:
+                line_end = mm.find(b'\n', next_start, hi)
+                line_end = hi if line_end == -1 else line_end
+
+                line_date = self.parse_csv_date(mm[next_start:line_end], date_format)
+                next_start = line_end + 1
+
+            next_start = min(next_start, hi)
+
+            if line_date is not None and (line_date <= date if after else line_date < date):
+                lo = next_start
+            else:
+                hi = line_start
+
+        return lo
+
+    def parse_csv_date(self, line, date_format):
+        # parse_csv_date - date in the first column of a CSV line (None if it doesn't parse)
+        #
+
+        try:
+            return datetime.datetime.strptime(line.split(b',', 1)[0].strip().strip(b'"').decode('latin-1'),
+                                              date_format)
+        except ValueError:
+            return None
+
+    def iterate_csv(self, csv_file, date_formats, chunksize = 100000, start_date = None, finish_date = None):
+        # iterate_csv - reads a CSV file with dates in the first column chunksize rows at a time, so histories
+        # too big for memory can be processed as a sequence of consecutive time slices
+        #
+        # csv_file = path of the CSV file
+        # date_formats = candidate strptime layouts for the dates (sniffed from the first chunk)
+        # chunksize = rows per chunk
+        # start_date, finish_date = only yield rows between these dates (None for no limit), the file must be sorted
+        #                           by date (chunks before start_date are still read, those after finish_date aren't)
+        #
+
+        date_format = None
+        first_row = 0
+
+        if start_date is not None: start_date = pandas.Timestamp(start_date)
+        if finish_date is not None: finish_date = pandas.Timestamp(finish_date)
+
+        for spot in pandas.read_csv(csv_file, index_col = 0, chunksize = chunksize):
+            if date_format is None:
+                date_format = self.sniff_date_format(spot.index.values[0:self.sniff_rows], date_formats)
+
+            rows = len(spot.index)
+
+            spot = self.parse_date_index(spot, date_format, csv_file, first_row = first_row)
+            first_row = first_row + rows
+
+            if start_date is not None:
+                spot = spot.loc[spot.index >= start_date]
+
+            if finish_date is not None:
+                past_finish = len(spot.index) > 0 and spot.index[-1] > finish_date
+                spot = spot.loc[spot.index <= finish_date]
+
+                if past_finish:
+                    if len(spot.index) > 0: yield spot
+                    return
+
+            if len(spot.index) > 0:
+                yield spot
+
+    def parse_date_index(self, spot, date_format, csv_file, first_row = 0, first_byte = None):
+        # parse_date_index - parses the string index of a frame read from csv_file into dates in one vectorised pass,
+        # reporting and dropping rows which don't match
+        #
+        # spot = data frame with string dates as the index
+        # date_format = strptime layout of the dates
+        # csv_file = path of the CSV file (for reporting)
+        # first_row = row number of the first row of spot in the file (when reading in chunks)
+        # first_byte = byte offset of the first row of spot, when its row number isn't known (when reading a range)
+        #
+
+        str_dates = spot.index.values
+
+        dates = pandas.to_datetime(str_dates, format = date_format, errors = 'coerce')
+        bad = numpy.asarray(pandas.isnull(dates))
+
+        if bad.any():
+            if first_row is None:
+                # 1-based lines counted from first_byte
+                lines = numpy.nonzero(bad)[0] + 1
+                where = ' at lines (from byte ' + str(first_byte) + ') '
+            else:
+                # + 2 for the header and 1-based line numbers
+                lines = numpy.nonzero(bad)[0] + first_row + 2
+                where = ' at lines '
+
+            print('Dropped ' + str(len(lines)) + ' rows from ' + str(csv_file) + ' not matching ' + date_format
+                  + where + ', '.join([str(l) for l in lines[0:10]]) + (', ...' if len(lines) > 10 else ''))
+
+            spot = spot.loc[~bad]
+            dates = dates[~bad]
+
+        spot.index = pandas.DatetimeIndex(dates)
 
-        return spot
\ No newline at end of file
+        return spot
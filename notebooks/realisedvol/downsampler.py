@@ -0,0 +1,142 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for time series/maths
+import numpy
+import pandas
+
+class Downsampler:
+    # Downsampler - thins time series before plotting, keeping their shape (and peaks) so that the number of
+    # points sent to the browser depends on the width of the graph rather than on the length of the history
+    #
+
+    # points per pixel of graph width for each method (min/max keeps two points per bucket)
+    points_per_pixel = {'lttb': 1, 'minmax': 2}
+
+    def point_budget(self, width, method = 'lttb'):
+        # point_budget - number of points worth plotting on a graph width pixels wide
+        #
+        # width = width of the graph in pixels
+        # method = 'lttb' or 'minmax'
+        #
+
+        return int(width * self.points_per_pixel[method])
+
+    def lttb(self, x, y, threshold):
+        # lttb - indices of the points picked by largest-triangle-three-buckets
+        #
+        # x = numeric x values (ascending)
+        # y = y values (no NaNs)
+        # threshold = number of points to keep
+        #
+        # see Sveinn Steinarsson, "Downsampling Time Series for Visual Representation" (2013)
+        #
+
+        n = len(y)
+
+        if threshold >= n or threshold < 3:
+            return numpy.arange(n)
+
+        indices = numpy.empty(threshold, dtype = numpy.int64)
+        indices[0] = 0; indices[-1] = n - 1
+
+        # first and last points are kept, the rest are split into threshold - 2 buckets
+        edges = numpy.linspace(1, n - 1, threshold - 1).astype(numpy.int64)
+
+        a = 0
+
+        for i in range(0, threshold - 2):
+            start, end = edges[i], edges[i + 1]
+
+            # average of the next bucket (or the last point)
+            if i < threshold - 3:
+                next_x = x[end:edges[i + 2]].mean(); next_y = y[end:edges[i + 2]].mean()
+            else:
+                next_x = x[n - 1]; next_y = y[n - 1]
+
+            # pick the point making the largest triangle with the last point picked and the next bucket's average
+            area = numpy.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+
+            a = start + int(numpy.argmax(area))
+            indices[i + 1] = a
+
+        return indices
+
+    def min_max(self, y, threshold):
+        # min_max - indices of the smallest and largest point in each bucket
+        #
+        # y = y values (no NaNs)
+        # threshold = number of points to keep (two per bucket)
+        #
+
+        n = len(y)
+        buckets = threshold // 2
+
+        if threshold >= n or buckets < 1:
+            return numpy.arange(n)
+
+        size = int(numpy.ceil(n / float(buckets)))
+
+        # pad the last bucket so we can find all the extremes with a single reshape
+        padded = numpy.empty(buckets * size)
+        padded[0:n] = y
+
+        padded[n:] = numpy.inf
+        mins = numpy.argmin(padded.reshape(buckets, size), axis = 1)
+
+        padded[n:] = -numpy.inf
+        maxs = numpy.argmax(padded.reshape(buckets, size), axis = 1)
+
+        offsets = numpy.arange(buckets) * size
+        indices = numpy.unique(numpy.concatenate((mins + offsets, maxs + offsets)))
+
+        return indices[indices < n]
+
+    def downsample(self, x, y, threshold, method = 'lttb'):
+        # downsample - indices of the points to keep, ignoring NaNs
+        #
+        # x = numeric x values (ascending)
+        # y = y values
+        # threshold = number of points to keep
+        # method = 'lttb' or 'minmax'
+        #
+
+        valid = numpy.nonzero(~numpy.isnan(y))[0]
+
+        if method == 'lttb':
+            keep = self.lttb(x[valid], y[valid], threshold)
+        elif method == 'minmax':
+            keep = self.min_max(y[valid], threshold)
+        else:
+            raise Exception('Unknown downsampling method ' + str(method))
+
+        return valid[keep]
+
+    def downsample_df(self, dataframe, threshold, method = 'lttb'):
+        # downsample_df - thins a data frame to roughly threshold points per column
+        #
+        # dataframe = data frame due to be thinned (all columns are kept aligned on the same rows)
+        # threshold = number of points to keep per column
+        # method = 'lttb' or 'minmax'
+        #
+
+        if len(dataframe.index) <= threshold:
+            return dataframe
+
+        if isinstance(dataframe.index, pandas.DatetimeIndex):
+            x = dataframe.index.values.astype('datetime64[ns]').view(numpy.int64).astype(numpy.float64)
+        else:
+            try:
+                x = numpy.asarray(dataframe.index.values, dtype = numpy.float64)
+            except (TypeError, ValueError):
+                # labels which aren't numbers, so just space the points evenly
+                x = numpy.arange(len(dataframe.index), dtype = numpy.float64)
+
+        rows = [self.downsample(x, dataframe[key].values.astype(numpy.float64), threshold, method)
+                for key in dataframe]
+
+        return dataframe.iloc[numpy.unique(numpy.concatenate(rows))]
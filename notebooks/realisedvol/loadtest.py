@@ -0,0 +1,204 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# Load test for the realised vol slider (realisedvolslider.py)
+#
+# starts the app locally on EURUSD.csv, then drives a number of simulated Socket.IO clients which each send
+# random (frequency, period, title) states on the 'replot' channel and wait for the 'postMessage' reply,
+# recording replot latency, throughput and payload sizes
+#
+# eg. python loadtest.py --clients 20 --duration 60
+
+# for running the app and the clients
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# for random slider states and statistics
+import json
+import random
+import numpy
+
+# pip install socketIO-client (see requirements.txt)
+from socketIO_client import SocketIO
+
+class ReplotClient(threading.Thread):
+    # ReplotClient - simulated analyst dragging the sliders: sends a state, waits for the plot, repeats
+    #
+
+    def __init__(self, host, port, finish_time, timeout = 30.0):
+        # host, port = where the app is listening
+        # finish_time = time.time() at which to stop
+        # timeout = seconds to wait for a reply before counting it as lost
+        #
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.host = host
+        self.port = port
+        self.finish_time = finish_time
+        self.timeout = timeout
+
+        self.latencies = []
+        self.payload_sizes = []
+        self.timeouts = 0
+        self.errors = 0
+
+        self.reply = None
+
+    def on_post_message(self, *args):
+        self.reply = args[0] if len(args) > 0 else ''
+
+    def random_state(self):
+        return {
+            'frequency': str(random.randrange(5, 65, 5)),
+            'period': str(random.randrange(1, 21)),
+            'title': 'load test ' + str(random.randint(0, 1000000)) + ' '
+        }
+
+    def run(self):
+        try:
+            sock = SocketIO(self.host, self.port)
+            sock.on('postMessage', self.on_post_message)
+        except Exception:
+            self.errors = self.errors + 1
+
+            return
+
+        while time.time() < self.finish_time:
+            self.reply = None
+
+            start = time.time()
+            sock.emit('replot', self.random_state())
+
+            while self.reply is None and time.time() - start < self.timeout:
+                sock.wait(seconds = 0.01)
+
+            if self.reply is None:
+                self.timeouts = self.timeouts + 1
+            else:
+                self.latencies.append(time.time() - start)
+                self.payload_sizes.append(len(self.reply))
+
+        sock.disconnect()
+
+def wait_for_port(host, port, timeout, process = None):
+    # wait_for_port - blocks until something is listening on host:port (the app loads its data first)
+    #
+    # process = child process which should be listening, an exception is raised as soon as it exits
+    #
+
+    finish_time = time.time() + timeout
+
+    while time.time() < finish_time:
+        if process is not None and process.poll() is not None:
+            raise Exception('App exited with code ' + str(process.returncode) + ' before listening on port ' + str(port))
+
+        try:
+            socket.create_connection((host, port), timeout = 1).close()
+
+            return True
+        except socket.error:
+            time.sleep(0.5)
+
+    return False
+
+def start_app(port, csv_file):
+    # start_app - runs the slider app in a child process, on localhost and without the debug reloader
+    #
+
+    env = dict(os.environ)
+    env['EURUSD_CSV'] = csv_file
+
+    code = 'import realisedvolslider as s; s.app.debug = False; s.socketio.run(s.app, host = "127.0.0.1", port = %d)' \
+           % port
+
+    return subprocess.Popen([sys.executable, '-c', code], env = env,
+                            cwd = os.path.dirname(os.path.abspath(__file__)))
+
+def percentiles(values):
+    if len(values) == 0:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+    p50, p95, p99 = numpy.percentile(values, [50, 95, 99])
+
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'max': max(values)}
+
+def load_test(clients, duration, port, csv_file, startup_timeout = 300):
+    # load_test - runs the load test and returns the report as a dict
+    #
+    # clients = number of simulated clients
+    # duration = seconds to run the clients for
+    # port = port to start the app on
+    # csv_file = intraday data to back the app
+    # startup_timeout = seconds to wait for the app to load its data
+    #
+
+    host = '127.0.0.1'
+    app = start_app(port, csv_file)
+
+    try:
+        if not wait_for_port(host, port, startup_timeout, process = app):
+            raise Exception('App did not start listening on port ' + str(port))
+
+        finish_time = time.time() + duration
+        threads = [ReplotClient(host, port, finish_time) for i in range(0, clients)]
+
+        start = time.time()
+
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        elapsed = time.time() - start
+    finally:
+        app.terminate()
+        app.wait()
+
+    latencies = [l for t in threads for l in t.latencies]
+    payload_sizes = [p for t in threads for p in t.payload_sizes]
+
+    return {
+        'clients': clients,
+        'duration': elapsed,
+        'replots': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'timeouts': sum([t.timeouts for t in threads]),
+        'connection_errors': sum([t.errors for t in threads]),
+        'latency': percentiles(latencies),
+        'payload_bytes': {
+            'mean': numpy.mean(payload_sizes) if len(payload_sizes) > 0 else None,
+            'max': max(payload_sizes) if len(payload_sizes) > 0 else None,
+            'total': sum(payload_sizes)
+        }
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Load test the realised vol slider replot channel')
+    parser.add_argument('--clients', type = int, default = 10, help = 'number of simulated clients')
+    parser.add_argument('--duration', type = float, default = 30.0, help = 'seconds to run for')
+    parser.add_argument('--port', type = int, default = 5055, help = 'port to start the app on')
+    parser.add_argument('--csv', default = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'EURUSD.csv'),
+                        help = 'intraday CSV backing the app')
+    parser.add_argument('--report', default = 'loadtest-report.json', help = 'where to write the JSON report')
+
+    args = parser.parse_args()
+
+    report = load_test(args.clients, args.duration, args.port, args.csv)
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent = 4)
+
+    print('%d clients, %.1fs: %d replots (%.1f/s), %d timeouts' %
+          (report['clients'], report['duration'], report['replots'], report['throughput'], report['timeouts']))
+    print('latency p50 %s, p95 %s, p99 %s' %
+          tuple(['-' if report['latency'][p] is None else '%.3fs' % report['latency'][p] for p in ['p50', 'p95', 'p99']]))
+    print('payload mean %s bytes, report written to %s' % (report['payload_bytes']['mean'], args.report))
@@ -0,0 +1,76 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+from collections import OrderedDict
+import threading
+
+class LRUCache:
+    # LRUCache - bounded, thread safe map which evicts the least recently used entry when full
+    # and counts hits and misses
+    #
+
+    def __init__(self, max_size = 256):
+        # max_size = maximum number of entries to keep
+        #
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        # get - returns the value for key (marking it as most recently used) or None if not cached
+        #
+        # key = hashable key
+        #
+
+        with self.lock:
+            if key not in self.entries:
+                self.misses = self.misses + 1
+
+                return None
+
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            self.hits = self.hits + 1
+
+            return value
+
+    def put(self, key, value):
+        # put - stores value for key, evicting the least recently used entry if the cache is full
+        #
+        # key = hashable key
+        # value = value to cache
+        #
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.pop(key)
+            elif len(self.entries) >= self.max_size:
+                self.entries.popitem(last = False)
+                self.evictions = self.evictions + 1
+
+            self.entries[key] = value
+
+    def stats(self):
+        # stats - hit/miss counters as a dict
+        #
+
+        with self.lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups > 0 else 0.0
+            }
@@ -8,10 +8,18 @@ __author__ = 'saeedamen'
 # for dates
 import datetime
 
+# for binary encoding of traces
+import base64
+import numpy
+import pandas
+
 # for plotting data
 import plotly
 from plotly.graph_objs import *
 
+# for thinning lines before plotting
+from downsampler import Downsampler
+
 class PlotHelper:
     def parse_dates(self, str_dates):
         # parse_dates - parses string dates into Python format
@@ -27,7 +35,8 @@ class PlotHelper:
         return dates
 
     def convert_df_plotly(self, dataframe, axis_no = 1, color_def = ['default'],
-                          special_line = 'Mean', showlegend = True, addmarker = False, gradcolor = None):
+                          special_line = 'Mean', showlegend = True, addmarker = False, gradcolor = None,
+                          downsample = None, width = 1000, encoding = None, binary_dtype = 'f8'):
         # convert_df_plotly - converts a Pandas data frame to Plotly format for line plots
         # dataframe = data frame due to be converted
         # axis_no = axis for plot to be drawn (default = 1)
@@ -36,12 +45,27 @@ class PlotHelper:
         # showlegend = True or False to show legend of this line on plot
         # addmarker = True or False to add markers
         # gradcolor = Create a graduated color scheme for the lines
+        # downsample = None, 'lttb' or 'minmax' to thin the lines to a number of points set by the graph width
+        # width = width of the graph in pixels (used when downsampling)
+        # encoding = None for plain lists or 'binary' for base64 typed arrays (dates become epoch milliseconds,
+        #            so set the x axis type to 'date', and the page needs the plot_data_decoder shim)
+        # binary_dtype = 'f8' or 'f4' for the y values when encoding = 'binary'
+        #
+        # returns a list of traces (pass it to share_x to serialise the index once rather than in every trace)
         #
         # Also see http://nbviewer.ipython.org/gist/nipunreddevil/7734529 for converting dataframe to traces
         # Also see http://moderndata.plot.ly/color-scales-in-ipython-notebook/
 
+        if downsample is not None:
+            downsampler = Downsampler()
+            dataframe = downsampler.downsample_df(dataframe, downsampler.point_budget(width, downsample), downsample)
+
         x = dataframe.index
 
+        if encoding == 'binary':
+            # the same encoded x is shared by every trace
+            x = self.encode_index(x)
+
         traces = []
 
         # will be used for market opacity for the markers
@@ -57,9 +81,14 @@ class PlotHelper:
         i = 0
 
         for key in dataframe:
+            y = dataframe[key].values
+
+            if encoding == 'binary':
+                y = self.encode_array(y, binary_dtype)
+
             scatter = plotly.graph_objs.Scatter(
                         x = x,
-                        y = dataframe[key].values,
+                        y = y,
                         name = key,
                         xaxis = 'x' + str(axis_no),
                         yaxis = 'y' + str(axis_no),
@@ -103,6 +132,50 @@ class PlotHelper:
 
         return traces
 
+    def share_x(self, traces):
+        # share_x - takes the x out of traces which all have the same x (as convert_df_plotly's do), so it is
+        # serialised once
+        #
+        # traces = list of traces
+        #
+        # returns {'shared': {'x': x}, 'data': traces} with each trace's x replaced by {'$ref': 'x'}, to be sent
+        # as the "shared" and "data" of a plot message, which the plot_data_decoder shim puts back together
+        #
+
+        # plain dicts, as graph_objs won't take a $ref for x (older plotly's graph_objs are dicts already)
+        data = [trace.to_plotly_json() if hasattr(trace, 'to_plotly_json') else dict(trace) for trace in traces]
+
+        shared = {'x': data[0]['x']} if len(data) > 0 else {}
+
+        for trace in data:
+            trace['x'] = {'$ref': 'x'}
+
+        return {'shared': shared, 'data': data}
+
+    def encode_array(self, values, dtype = 'f8'):
+        # encode_array - encodes a numeric array as a base64 typed array, in plotly.js' {dtype, bdata} form
+        #
+        # values = numeric array
+        # dtype = 'f8' (float64) or 'f4' (float32), little endian
+        #
+
+        values = numpy.ascontiguousarray(values, dtype = numpy.dtype('<' + dtype))
+
+        return {'dtype': dtype, 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+    def encode_index(self, index):
+        # encode_index - encodes an index as a base64 float64 typed array (dates as epoch milliseconds)
+        #
+        # index = data frame index
+        #
+
+        if isinstance(index, pandas.DatetimeIndex):
+            values = index.values.astype('datetime64[ms]').view(numpy.int64)
+        else:
+            values = index.values
+
+        return self.encode_array(values, 'f8')
+
     def create_layout(self, title, xaxis, yaxis, width = -1, height = -1):
         # create_layout - populates a layout object
         # title = title of the plot
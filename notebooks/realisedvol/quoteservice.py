@@ -0,0 +1,285 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for polling
+import asyncio
+import csv
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, quote
+
+# for missing values
+import numpy
+
+# fields of the Yahoo quotes.csv format sl1d1t1c1ohgv
+QuoteAttrs = ['symbol', 'price', 'date', 'time', 'change', 'open', 'high', 'low', 'volume']
+Quote = namedtuple('Quote', QuoteAttrs)
+
+def parse_number(value, type = float):
+    # quotes.csv has N/A for missing values
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+def parse_quotes(text):
+    # parse_quotes - parses a quotes.csv response (format sl1d1t1c1ohgv) into Quotes
+    #
+    # text = body of the response
+    #
+
+    quotes = []
+
+    for row in csv.reader(text.splitlines()):
+        if len(row) < len(QuoteAttrs): continue
+
+        quotes.append(Quote(symbol = row[0], price = parse_number(row[1]), date = row[2], time = row[3],
+                            change = parse_number(row[4]), open = parse_number(row[5]),
+                            high = parse_number(row[6]), low = parse_number(row[7]),
+                            volume = parse_number(row[8], int)))
+
+    return quotes
+
+class HttpConnectionPool:
+    # HttpConnectionPool - keep-alive HTTP/1.1 connections to one host, reused across GET requests
+    #
+
+    def __init__(self, host, port = 80, max_connections = 4, timeout = 10.0):
+        # host, port = server to connect to
+        # max_connections = most connections open (and requests in flight) at once
+        # timeout = seconds to wait for a connection or a response
+        #
+
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.idle = []
+        self.semaphore = asyncio.Semaphore(max_connections)
+
+        self.connections_opened = 0
+        self.requests = 0
+        self.retries = 0
+
+    async def open_connection(self):
+        self.connections_opened = self.connections_opened + 1
+
+        # a hung connect times out like a hung request
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def read_response(self, reader):
+        # read_response - reads status, headers and body, returns (status, body, keep_alive)
+        #
+
+        status_line = await reader.readline()
+
+        if not status_line:
+            raise ConnectionError('Connection closed by ' + self.host)
+
+        version, status = status_line.decode('latin-1').split(' ', 2)[0:2]
+
+        headers = {}
+
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+
+            if line == '': break
+
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+
+                if size == 0:
+                    await reader.readline()
+                    break
+
+                body = body + await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            # no length, so the body runs to the end of the connection
+            body = await reader.read()
+            keep_alive = False
+
+        return int(status), body, keep_alive
+
+    async def request(self, connection, path):
+        reader, writer = connection
+
+        writer.write(('GET ' + path + ' HTTP/1.1\r\nHost: ' + self.host + '\r\nConnection: keep-alive\r\n\r\n')
+                     .encode('latin-1'))
+        await writer.drain()
+
+        return await asyncio.wait_for(self.read_response(reader), self.timeout)
+
+    async def get(self, path):
+        # get - GETs path on a pooled connection, returns (status, body)
+        #
+        # path = path and query string
+        #
+
+        async with self.semaphore:
+            self.requests = self.requests + 1
+
+            reused = len(self.idle) > 0
+            connection = self.idle.pop() if reused else await self.open_connection()
+            keep_alive = False
+
+            try:
+                try:
+                    status, body, keep_alive = await self.request(connection, path)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # the server may have closed an idle connection, so try once more on a fresh one
+                    if not reused: raise
+
+                    connection[1].close()
+                    self.retries = self.retries + 1
+
+                    connection = await self.open_connection()
+                    status, body, keep_alive = await self.request(connection, path)
+            finally:
+                # whichever connection we ended up on goes back to the pool or is closed, even on failure
+                if keep_alive:
+                    self.idle.append(connection)
+                else:
+                    connection[1].close()
+
+            return status, body
+
+    def close(self):
+        for reader, writer in self.idle:
+            writer.close()
+
+        self.idle = []
+
+class LiveQuoteService:
+    # LiveQuoteService - polls live quotes for a universe of tickers concurrently over pooled connections
+    # and fans each round of quotes out to subscribers
+    #
+
+    def __init__(self, tickers, url = 'http://finance.yahoo.com/d/quotes.csv', interval = 1.0,
+                 tickers_per_request = 50, max_connections = 4):
+        # tickers = vendor tickers to poll (eg. 'EURUSD=X')
+        # url = quotes.csv endpoint
+        # interval = seconds between the start of each polling round
+        # tickers_per_request = tickers asked for in each request
+        # max_connections = requests in flight at once
+        #
+
+        self.tickers = list(tickers)
+        self.interval = interval
+        self.tickers_per_request = tickers_per_request
+
+        split = urlsplit(url)
+        self.path = split.path
+        self.pool = HttpConnectionPool(split.hostname, split.port or 80, max_connections = max_connections)
+
+        self.subscribers = []
+        self.stopped = False
+
+        self.rounds = 0
+        self.failed_requests = 0
+
+    def subscribe(self, callback = None):
+        # subscribe - registers a callback (called with a dict of symbol to Quote each round),
+        # or if no callback is given returns an asyncio.Queue which each round's quotes are put on
+        #
+
+        if callback is None:
+            queue = asyncio.Queue()
+            self.subscribers.append(queue.put_nowait)
+
+            return queue
+
+        self.subscribers.append(callback)
+
+        return callback
+
+    async def fetch(self, tickers):
+        # fetch - gets quotes for a batch of tickers in one request
+        #
+
+        path = self.path + '?s=' + '+'.join([quote(t) for t in tickers]) + '&f=sl1d1t1c1ohgv&e=.csv'
+
+        try:
+            status, body = await self.pool.get(path)
+
+            if status != 200:
+                raise Exception('HTTP ' + str(status))
+
+            return parse_quotes(body.decode('latin-1'))
+        except Exception as e:
+            self.failed_requests = self.failed_requests + 1
+            print('Failed to get quotes for ' + ','.join(tickers) + ': ' + str(e))
+
+            return []
+
+    async def poll_once(self):
+        # poll_once - fetches quotes for the whole universe concurrently, returns a dict of symbol to Quote
+        #
+
+        batches = [self.tickers[i:i + self.tickers_per_request]
+                   for i in range(0, len(self.tickers), self.tickers_per_request)]
+
+        results = await asyncio.gather(*[self.fetch(b) for b in batches])
+
+        quotes = dict([(q.symbol, q) for result in results for q in result])
+
+        self.rounds = self.rounds + 1
+
+        for subscriber in self.subscribers:
+            subscriber(quotes)
+
+        return quotes
+
+    async def run(self):
+        # run - polls every interval seconds until stop is called
+        #
+
+        try:
+            while not self.stopped:
+                start = time.time()
+
+                await self.poll_once()
+                await asyncio.sleep(max(0, self.interval - (time.time() - start)))
+        finally:
+            self.pool.close()
+
+    def stop(self):
+        self.stopped = True
+
+if __name__ == '__main__':
+    # poll a stub quotes.csv server on localhost
+    from stubs import StubQuoteServer
+
+    server = StubQuoteServer()
+    server.start()
+
+    async def demo():
+        service = LiveQuoteService(['EURUSD=X', 'GBPUSD=X', 'USDJPY=X', 'AUDUSD=X'],
+                                   url = server.url, interval = 0.5, tickers_per_request = 2)
+        service.subscribe(lambda quotes: print(sorted([(q.symbol, q.price) for q in quotes.values()])))
+
+        task = asyncio.ensure_future(service.run())
+        await asyncio.sleep(2.2)
+        service.stop()
+        await task
+
+        print('%d rounds, %d requests on %d connections' %
+              (service.rounds, service.pool.requests, service.pool.connections_opened))
+
+    asyncio.run(demo())
+
+    server.stop()
@@ -5,13 +5,15 @@ __author__ = 'saeedamen'
     You are free to modify and distribute this code as you see fit provided this source is cited
 """
 # for time series/maths
-import math
 from datetime import timedelta
 import time
 
+# for picking up the CSV location
+import os
+
 # Flask application
-from flask import Flask, render_template
-from flask.ext.socketio import SocketIO, emit
+from flask import Flask, render_template, request
+from flask_socketio import SocketIO
 
 # for plotting
 import json
@@ -21,14 +23,16 @@ import plotly
 import dash.utils as utils
 from dash.components import element as el
 from dash.components import graph
-
-# for time series manipulation
-import pandas
-import pandas.io.data as web
+from dash.components import plot_data_decoder
 
 import datetime
 
 from datadownloader import DataDownloader
+from volcalculator import ReturnCube
+from lrucache import LRUCache
+from coalescingpool import CoalescingPool
+from downsampler import Downsampler
+from plothelper import PlotHelper
 
 def load_data():
     ticker = 'EURUSD' # will use in plot titles later (and for creating Plotly URL)
@@ -36,6 +40,7 @@ def load_data():
     ##### download intraday EUR/USD data from Bloomberg or CSV file
     source = "Bloomberg"
     source = "CSV"
+    source = "store"   # binary copy of the CSV, which is only parsed on first use
 
     csv_file = None
 
@@ -45,10 +50,11 @@ def load_data():
 
     if source == 'Bloomberg':
         vendor_ticker = 'EURUSD BGN Curncy'
-    elif source == 'CSV':
+    elif source in ('CSV', 'store'):
         # you can get free FX intraday data from Gain Capital (if you don't have Bloomberg)
         vendor_ticker = 'EURUSD'
-        csv_file = 'D:/EURUSD.csv'
+        start_date = None   # the sample file is historic, so read all of it
+        csv_file = os.environ.get('EURUSD_CSV', 'D:/EURUSD.csv')
 
     return data_downloader.download_time_series(vendor_ticker, ticker, start_date, source, csv_file = csv_file, freq = freq)
 
@@ -60,14 +66,34 @@ app.config['key'] = 'secret'
 app.config['last'] = time.time()
 socketio = SocketIO(app)
 spot = load_data()
+
+# precompute returns for every frequency on the slider, so replots don't rescan the history
+return_cube = ReturnCube(spot, range(5, 65, 5))
+
+# serialised plot data by (frequency, period), sliders get dragged back and forth over the same states
+replot_cache = LRUCache(max_size = 240)
+
+# replots run on a few worker threads (sharing spot and the return cube), latest slider state per client only
+replot_pool = CoalescingPool(max_workers = 4)
+
 graph_id = 'realised-vol-slider'
 
+# points sent per plot scale with the width of the graph, not the length of the history
+downsampler = Downsampler()
+downsample_method = 'minmax'    # or 'lttb'
+graph_width = 1000              # pixels
+
+# send plot data as base64 typed arrays ('binary') or JSON lists (None)
+plot_helper = PlotHelper()
+plot_encoding = 'binary'
+
 # write the HTML "includes" blocks to /templates/runtime/dash-1-hello-world
 # alternatively, include the HTML yourself in that folder
 utils.write_templates(
     {
         'header': [
-            el('H1', {}, 'Dash to investigate realised vol')
+            el('H1', {}, 'Dash to investigate realised vol'),
+            plot_data_decoder()
         ],
 
         'controls': [
@@ -111,55 +137,78 @@ def index():
     return render_template('layouts/layout_single_column_and_controls.html',
                            app_name = name)
 
+@app.route('/cache-stats')
+def cache_stats():
+    return json.dumps(replot_cache.stats())
+
+@app.route('/pool-stats')
+def pool_stats():
+    return json.dumps(replot_pool.stats())
+
+def replot_data(frequency, period):
+    # replot_data - serialised shared arrays and plot data (without layout) for the slider state
+    #
+    # frequency = sampling frequency in minutes
+    # period = realised vol window in days
+    #
+
+    # realised volatility from the precomputed returns for this minute frequency
+    vol = return_cube.realised_vol(frequency, period)
+
+    # thin to what the graph can show (quicker to plot)
+    to_plot = downsampler.downsample_df(vol, downsampler.point_budget(graph_width, downsample_method),
+                                        downsample_method)
+
+    # the dates are serialised once in a shared table, which every trace's x refers to
+    message = plot_helper.share_x(plot_helper.convert_df_plotly(to_plot, encoding = plot_encoding))
+
+    return json.dumps(message['shared'], cls = plotly.utils.PlotlyJSONEncoder), \
+           json.dumps(message['data'], cls = plotly.utils.PlotlyJSONEncoder)
+
 @socketio.on('replot')
 def replot(app_state):
-    print(app_state) # for debugging
+    # hand the work to the pool so the socket thread is free, any older state still waiting for this
+    # client is dropped
+    replot_pool.submit(request.sid, replot_job, request.sid, app_state)
+
+def replot_job(sid, app_state):
+    # replot_job - builds the plot for the slider state and posts it back to the client (runs on the pool)
+    #
+    # sid = socket session of the client
+    # app_state = state of the controls
+    #
 
     frequency = float(app_state['frequency'])
     period = float(app_state['period'])
     period_mins = period * (1440.0 / frequency)
 
-    # resample data for minute frequency specified
-    resampled = spot.loc[spot.index.minute % frequency == 0]
-    resampled = resampled.dropna()
-
-    # calculate returns (need for realised volatility calculation)
-    rets = resampled / resampled.shift(1) - 1
-
-    # calculate realised volatility (careful with annualisation factor!)
-    vol = pandas.rolling_std(rets, period_mins) * math.sqrt(252.0 * (1440.0 / frequency)) * 100
-
-    # resample to daily data (quicker to plot)
-    to_plot = vol.loc[vol.index.hour % 20 == 0]
-    to_plot = to_plot.loc[to_plot.index.minute % 60 == 0]
-
-    x = pandas.to_datetime(to_plot.index.values, format='%Y-%m-%d %H:%M')
-    y = to_plot.ix[:,0]
-
-    # define graph in JSON format
-    messages = [
-        {
-            'id': graph_id,
-            'task': 'newPlot',
-            'data': [{
-                'x': x,
-                'y': y
-            }],
-            'layout': {
-                'xaxis': {
-                    'title' : 'Date'
-                },
-                'yaxis': {
-                    'title' : 'Vol'
-                },
-                'title': app_state.get('title', '') + 'freq = ' + str(frequency) + ' mins, period = '
-                         + str(period) + ' days, ' + str(period_mins) + ' points'
-            }
-        }
-    ]
+    # the data only depends on the sliders, so reuse it if we've seen them before (only the title changes)
+    cached = replot_cache.get((frequency, period))
+
+    if cached is None:
+        cached = replot_data(frequency, period)
+        replot_cache.put((frequency, period), cached)
+
+    shared, data = cached
+
+    layout = {
+        'xaxis': {
+            'title' : 'Date',
+            'type' : 'date'
+        },
+        'yaxis': {
+            'title' : 'Vol'
+        },
+        'title': app_state.get('title', '') + 'freq = ' + str(frequency) + ' mins, period = '
+                 + str(period) + ' days, ' + str(period_mins) + ' points'
+    }
+
+    # define graph in JSON format, splicing the cached data in
+    messages = '[{"id": %s, "task": "newPlot", "shared": %s, "data": %s, "layout": %s}]' % \
+               (json.dumps(graph_id), shared, data, json.dumps(layout))
 
     # post JSON message
-    emit('postMessage', json.dumps(messages, cls = plotly.utils.PlotlyJSONEncoder))
+    socketio.emit('postMessage', messages, room = sid)
 
 if __name__ == '__main__':
     socketio.run(app)
@@ -18,11 +18,12 @@ postfix = "test"
 
 # for time series manipulation
 import pandas
-import pandas.io.data as web
 
 import datetime
 
 from datadownloader import DataDownloader
+from volcalculator import StreamingRealisedVol
+from streampipeline import TickBuffer, QuotePoller, BatchPublisher
 
 def streaming_fx_study():
 
@@ -34,7 +35,10 @@ def streaming_fx_study():
 
     # Learn about stream id here at: http://help.plot.ly/documentation/python/streaming-tutorial/
     # Find your stream_id here: https://plot.ly/settings/api
-    stream_id = "XXXX"
+    # one stream for the spot line and a separate one for the realised vol line of each ticker
+    tickers = [('EURUSD', 'EURUSD=X', 'EURUSD Curncy'), ('GBPUSD', 'GBPUSD=X', 'GBPUSD Curncy'),
+               ('USDJPY', 'USDJPY=X', 'USDJPY Curncy')]
+    stream_ids = {'EURUSD': ("XXXX", "XXXX"), 'GBPUSD': ("XXXX", "XXXX"), 'USDJPY': ("XXXX", "XXXX")}
 
     plotly.tools.set_credentials_file(username=plotly_username, api_key=plotly_api_key)
 
@@ -43,51 +47,121 @@ def streaming_fx_study():
 
     data_downloader = DataDownloader()
 
-    ticker = 'EURUSD'; vendor_ticker = 'EURUSD=X'
     postfix = '-test'
 
-    # Make instance of stream id object
-    stream = plotly.graph_objs.Stream(
-            token = stream_id,  # (!) link stream id to 'token' key
-            maxpoints = max_points      # (!) keep a max of 80 pts on screen
-    )
+    # 1 day realised vol sampling every 5 minutes, O(1) per tick
+    vol_frequency = 5
 
-    trace1 = plotly.graph_objs.Scatter(
-        x = [],
-        y = [],
-        mode = 'lines',
-        stream = stream         # (!) embed stream id, 1 per trace
-    )
+    # warm the window up with recent minute bars, otherwise the vol is NaN for the first day of quotes
+    # (Bloomberg's intraday bars are in GMT, so the live quotes are fed in with GMT times too)
+    history_source = 'Bloomberg'
 
-    data = Data([trace1])
+    streams = {}; vol_engines = {}; pretty_tickers = {}
 
-    # Add title to layout object
-    layout = Layout(title = ticker)
+    for ticker, vendor_ticker, history_ticker in tickers:
+        stream_id, vol_stream_id = stream_ids[ticker]
 
-    # Make a figure object
-    fig = Figure(data = data, layout = layout)
+        # Make instance of stream id object
+        stream = plotly.graph_objs.Stream(
+                token = stream_id,  # (!) link stream id to 'token' key
+                maxpoints = max_points      # (!) keep a max of 80 pts on screen
+        )
 
-    # Send fig to Plotly, initialize streaming plot, open new tab
-    py.iplot(fig, filename=ticker + "-stream" + postfix)
+        trace1 = plotly.graph_objs.Scatter(
+            x = [],
+            y = [],
+            mode = 'lines',
+            stream = stream         # (!) embed stream id, 1 per trace
+        )
 
-    # Make instance of the Stream link object, with same stream id as Stream id object
-    s = py.Stream(stream_id)
+        # realised vol on a second axis, updated tick by tick rather than recomputed over the history
+        trace2 = plotly.graph_objs.Scatter(
+            x = [],
+            y = [],
+            mode = 'lines',
+            yaxis = 'y2',
+            stream = plotly.graph_objs.Stream(token = vol_stream_id, maxpoints = max_points)
+        )
 
-    # Open the stream
-    s.open()
+        data = Data([trace1, trace2])
 
-    #### Grab live FX prices from Yahoo & plot point by point
-    #### till termination
+        # Add title to layout object
+        layout = Layout(title = ticker, yaxis2 = YAxis(title = 'Realised Vol', overlaying = 'y', side = 'right'))
+
+        # Make a figure object
+        fig = Figure(data = data, layout = layout)
+
+        # Send fig to Plotly, initialize streaming plot, open new tab
+        py.iplot(fig, filename=ticker + "-stream" + postfix)
 
-    while True:
-        x = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        # Make instance of the Stream link object, with same stream id as Stream id object, and open it
+        streams[(ticker, 'spot')] = py.Stream(stream_id)
+        streams[(ticker, 'vol')] = py.Stream(vol_stream_id)
+
+        vol_engine = StreamingRealisedVol(vol_frequency, 1)
 
         try:
-            y = data_downloader.download_live_quote(vendor_ticker, 'Yahoo')
-            s.write(dict(x = x, y = y))
-        except: pass
+            history = data_downloader.download_time_series(history_ticker, ticker,
+                                                           datetime.datetime.utcnow() - datetime.timedelta(days = 5),
+                                                           history_source, freq = 'intraday', freq_no = 1)
+            vol_engine.seed(history)
+        except Exception as e:
+            print('Failed to seed realised vol for ' + ticker + ' from ' + history_source + ' (' + str(e)
+                  + '), it starts after a day of quotes')
+
+        vol_engines[ticker] = vol_engine
+        pretty_tickers[vendor_ticker] = ticker
+
+    for s in streams.values():
+        s.open()
+
+    # polling only fills the buffer, a separate thread publishes it to Plotly in batches
+    # so a slow write (or quote) doesn't hold up the other
+    tick_buffer = TickBuffer(max_size = 10000)
+    publisher = BatchPublisher(tick_buffer, streams, flush_interval = 1.0, batch_size = 100)
+
+    #### Grab live FX prices from Yahoo for every ticker at once & plot point by point
+    #### till termination
+
+    def poll(vendor_tickers):
+        quotes = data_downloader.download_live_quotes(vendor_tickers, 'Yahoo')
+
+        now = datetime.datetime.now()
+        x = now.strftime('%Y-%m-%d %H:%M:%S.%f')
+        utc_now = datetime.datetime.utcnow()
+
+        ticks = []
+
+        for vendor_ticker, quote in quotes.items():
+            # missing prices come back as NaN
+            if quote.price != quote.price: continue
+
+            ticker = pretty_tickers[vendor_ticker]
+            vol = vol_engines[ticker].update(utc_now, quote.price)
+
+            ticks.append(((ticker, 'spot'), x, quote.price))
+
+            if vol == vol: ticks.append(((ticker, 'vol'), x, vol))
+
+        return ticks
+
+    # poll every second
+    poller = QuotePoller(tick_buffer, poll, interval = 1.0, name = 'Yahoo quotes', tickers = list(pretty_tickers.keys()))
+
+    publisher.start()
+    poller.start()
+
+    try:
+        while True:
+            time.sleep(60)
+
+            print(str(publisher.stats()) + ', failed polls ' + str(poller.failed_polls))
+    except KeyboardInterrupt:
+        poller.stop()
+        publisher.stop()
 
-        time.sleep(1)   # sleep for 1 second
+        for s in streams.values():
+            s.close()
 
 if __name__ == '__main__':
     streaming_fx_study()
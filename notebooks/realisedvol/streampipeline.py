@@ -0,0 +1,211 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for threading
+from collections import deque
+import threading
+import time
+import traceback
+
+class TickBuffer:
+    # TickBuffer - bounded ring buffer of ticks between the pollers and the publisher
+    #
+    # when full, put either waits for the publisher to make room (backpressure) or drops the oldest tick
+    #
+
+    def __init__(self, max_size = 10000):
+        # max_size = maximum number of ticks held
+        #
+
+        self.max_size = max_size
+        self.ticks = deque()
+        self.condition = threading.Condition()
+
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, tick, block = False, timeout = None):
+        # put - adds a tick to the buffer
+        #
+        # tick = tuple of (stream key, x, y)
+        # block = wait for room when the buffer is full (otherwise the oldest tick is dropped)
+        # timeout = seconds to wait when block = True, after which the oldest tick is dropped
+        #
+
+        with self.condition:
+            self.received = self.received + 1
+
+            if block and len(self.ticks) >= self.max_size:
+                finish_time = None if timeout is None else time.time() + timeout
+
+                while len(self.ticks) >= self.max_size:
+                    remaining = None if finish_time is None else finish_time - time.time()
+
+                    if remaining is not None and remaining <= 0: break
+
+                    self.condition.wait(remaining)
+
+            if len(self.ticks) >= self.max_size:
+                self.ticks.popleft()
+                self.dropped = self.dropped + 1
+
+            self.ticks.append(tick)
+            self.condition.notify_all()
+
+    def take(self, max_ticks, timeout):
+        # take - waits until there are max_ticks ticks (or timeout seconds pass) and removes up to max_ticks of them
+        #
+        # max_ticks = largest batch to return
+        # timeout = seconds to wait for a full batch
+        #
+
+        finish_time = time.time() + timeout
+
+        with self.condition:
+            while len(self.ticks) < max_ticks:
+                remaining = finish_time - time.time()
+
+                if remaining <= 0: break
+
+                self.condition.wait(remaining)
+
+            batch = [self.ticks.popleft() for i in range(0, min(max_ticks, len(self.ticks)))]
+            self.condition.notify_all()
+
+            return batch
+
+    def __len__(self):
+        with self.condition:
+            return len(self.ticks)
+
+class QuotePoller(threading.Thread):
+    # QuotePoller - thread which polls for quotes every interval seconds and puts them into a TickBuffer, so a slow
+    # quote never waits on the publisher (or the other way round)
+    #
+    # for many tickers give the list in tickers, so each round is one call to poll (eg. one
+    # DataDownloader.download_live_quotes, which gets them concurrently) rather than a poller per ticker
+    #
+
+    def __init__(self, tick_buffer, poll, interval = 1.0, name = 'poller', tickers = None):
+        # tick_buffer = TickBuffer to put the ticks into
+        # poll = function returning a list of (stream key, x, y) ticks each time it is called (with tickers, if given)
+        # interval = seconds between the start of each poll
+        # name = used when reporting failed polls
+        # tickers = list of tickers to poll together
+        #
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.tick_buffer = tick_buffer
+        self.poll = poll
+        self.interval = interval
+        self.name = name
+        self.tickers = tickers
+
+        self.stopped = threading.Event()
+
+        self.polls = 0
+        self.failed_polls = 0
+
+    def run(self):
+        while not self.stopped.is_set():
+            start = time.time()
+
+            try:
+                ticks = self.poll() if self.tickers is None else self.poll(self.tickers)
+
+                for tick in ticks:
+                    self.tick_buffer.put(tick)
+
+                self.polls = self.polls + 1
+            except Exception as e:
+                self.failed_polls = self.failed_polls + 1
+                print('Failed to poll ' + self.name + ' (' + str(self.failed_polls) + ' so far): ' + str(e))
+
+            self.stopped.wait(max(0, self.interval - (time.time() - start)))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+class BatchPublisher(threading.Thread):
+    # BatchPublisher - thread which flushes ticks from a TickBuffer in batches, when batch_size ticks are waiting
+    # or every flush_interval seconds
+    #
+    # each point is written on its own (dict(x = x, y = y)), as Plotly streams append scalar writes to the trace
+    # (keeping the last maxpoints) but take an array write as the whole of the trace's data
+    #
+
+    def __init__(self, tick_buffer, streams, flush_interval = 1.0, batch_size = 100):
+        # tick_buffer = TickBuffer the pollers put (stream key, x, y) ticks into
+        # streams = dict of stream key to an object with a write(dict(x = x, y = y)) method (eg. py.Stream)
+        # flush_interval = longest time in seconds a tick waits to be published
+        # batch_size = number of ticks which triggers a flush straight away
+        #
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.tick_buffer = tick_buffer
+        self.streams = streams
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.stopped = threading.Event()
+
+        self.batches = 0
+        self.published = 0
+        self.failed_writes = 0
+
+    def flush(self, batch):
+        # flush - writes a batch of ticks, a point at a time over each stream
+        #
+        # batch = list of (stream key, x, y) ticks
+        #
+
+        failed = set()
+
+        for key, x, y in batch:
+            # after a failed write, drop the rest of the stream's batch rather than fail again for every point
+            if key in failed: continue
+
+            try:
+                self.streams[key].write({'x': x, 'y': y})
+                self.published = self.published + 1
+            except Exception:
+                failed.add(key)
+                self.failed_writes = self.failed_writes + 1
+
+                traceback.print_exc()
+
+        self.batches = self.batches + 1
+
+    def run(self):
+        while not self.stopped.is_set():
+            batch = self.tick_buffer.take(self.batch_size, self.flush_interval)
+
+            if len(batch) > 0: self.flush(batch)
+
+        # publish whatever is left
+        batch = self.tick_buffer.take(len(self.tick_buffer), 0)
+
+        if len(batch) > 0: self.flush(batch)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def stats(self):
+        return {
+            'received': self.tick_buffer.received,
+            'dropped': self.tick_buffer.dropped,
+            'buffered': len(self.tick_buffer),
+            'batches': self.batches,
+            'published': self.published,
+            'failed_writes': self.failed_writes
+        }
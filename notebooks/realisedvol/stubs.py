@@ -0,0 +1,194 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# Stand-ins for the market data services we download from, so the downloading code can be run
+# and benchmarked offline
+
+# for the stub HTTP server
+import random
+import socket
+import threading
+import time
+
+# for the stub data source
+import datetime
+import os
+import tempfile
+import zlib
+import numpy
+import pandas
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class StubQuoteServer:
+    # StubQuoteServer - local HTTP server mimicking Yahoo's quotes.csv (format sl1d1t1c1ohgv), with keep-alive
+    #
+    # prices random walk from 1.0 for every symbol asked for, symbols starting with 'BAD' get N/A fields
+    # (prices holds the last price served for each symbol)
+    #
+
+    def __init__(self, port = 0):
+        # port = port to listen on (0 picks a free one)
+        #
+
+        self.prices = {}
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.connections = 0
+        self.open_sockets = set()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+
+                with stub.lock:
+                    stub.connections = stub.connections + 1
+                    stub.open_sockets.add(self.connection)
+
+            def finish(self):
+                with stub.lock: stub.open_sockets.discard(self.connection)
+
+                BaseHTTPRequestHandler.finish(self)
+
+            def do_GET(self):
+                symbols = parse_qs(urlsplit(self.path).query).get('s', [''])[0].split(' ')
+                body = ''.join([stub.quote_line(s) for s in symbols if s != '']).encode('latin-1')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = 'http://127.0.0.1:' + str(self.port) + '/d/quotes.csv'
+
+    def quote_line(self, symbol):
+        with self.lock:
+            self.requests = self.requests + 1
+
+            if symbol.startswith('BAD'):
+                return '"%s",N/A,"N/A","N/A",N/A,N/A,N/A,N/A,N/A\r\n' % symbol
+
+            last = self.prices.get(symbol, 1.0)
+            price = round(last * (1 + random.gauss(0, 0.0005)), 4)
+            self.prices[symbol] = price
+
+        return '"%s",%.4f,"6/16/2015","2:56pm",%.4f,%.4f,%.4f,%.4f,0\r\n' % \
+               (symbol, price, price - 1.0, 1.0, max(price, 1.0), min(price, 1.0))
+
+    def disconnect(self):
+        # disconnect - drops every open connection from the server side, as a server timing out idle keep-alive
+        # connections would
+        #
+
+        with self.lock:
+            sockets = list(self.open_sockets)
+
+        for s in sockets:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def start(self):
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class StubDataSource:
+    # StubDataSource - offline stand-in for a daily/intraday data source (pass it to DataDownloader in sources)
+    #
+    # prices are a random walk seeded from the ticker, so the same ticker always gives the same history,
+    # and every call and row served is counted
+    #
+
+    def __init__(self, first_date = datetime.datetime(2010, 1, 1), finish_date = None, latency = 0.0):
+        # first_date = start of the history the source has
+        # finish_date = end of the history (default = today)
+        # latency = seconds each download takes
+        #
+
+        self.first_date = pandas.Timestamp(first_date)
+        self.finish_date = finish_date
+        self.latency = latency
+        self.lock = threading.Lock()
+
+        self.calls = 0
+        self.rows_served = 0
+
+    def history(self, vendor_ticker, freq):
+        finish_date = pandas.Timestamp(self.finish_date or datetime.datetime.utcnow().date())
+        if freq == 'daily':
+            index = pandas.bdate_range(self.first_date, finish_date)
+        else:
+            index = pandas.date_range(self.first_date, finish_date, freq = 'min')
+
+        rng = numpy.random.RandomState(zlib.crc32(vendor_ticker.encode('utf-8')) & 0xffffffff)
+
+        return pandas.Series(100.0 * numpy.exp(numpy.cumsum(rng.normal(0, 0.01, len(index)))), index = index)
+
+    def download_time_series(self, vendor_ticker, pretty_ticker, start_date, freq):
+        if vendor_ticker.startswith('BAD'):
+            raise Exception('Unknown ticker ' + vendor_ticker)
+
+        time.sleep(self.latency)
+
+        history = self.history(vendor_ticker, freq)
+
+        if start_date is not None:
+            history = history.loc[history.index >= pandas.Timestamp(start_date)]
+
+        with self.lock:
+            self.calls = self.calls + 1
+            self.rows_served = self.rows_served + len(history.index)
+
+        return pandas.DataFrame(data = history.values, index = history.index, columns = [pretty_ticker])
+
+def write_synthetic_csv(rows, chunksize = 100000, folder = None):
+    # write_synthetic_csv - writes a random walk of minute closes to a CSV file, returns its path
+    #
+    # rows = minutes of history
+    # chunksize = rows written at a time (so building the file doesn't need it all in memory)
+    # folder = folder to write it in (default = a new temporary one)
+    #
+
+    path = os.path.join(folder or tempfile.mkdtemp(), 'synthetic.csv')
+    rng = numpy.random.RandomState(42)
+    last = 1.0
+
+    with open(path, 'w') as f:
+        f.write('Date,EURUSD\n')
+
+        for i in range(0, rows, chunksize):
+            n = min(chunksize, rows - i)
+            index = pandas.date_range(datetime.datetime(2005, 1, 1) + datetime.timedelta(minutes = i),
+                                      periods = n, freq = 'min')
+            prices = last * numpy.exp(numpy.cumsum(rng.normal(0, 0.0002, n)))
+            last = prices[-1]
+
+            pandas.DataFrame(data = prices, index = index).to_csv(f, header = False, date_format = '%Y-%m-%d %H:%M:%S')
+
+    return path
@@ -0,0 +1,63 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+import pytest
+
+from bbg_com import ReferenceDataRequest, RequestPipeline, Terminal
+from bbg_sim import SimTransport
+
+class DownTransport(SimTransport):
+    # terminal which can't be reached, so no session can be started
+    def create_session(self):
+        raise Exception('terminal is down')
+
+@pytest.fixture
+def transport():
+    old = Terminal.transport
+    yield
+    Terminal.close_sessions()
+    Terminal.transport = old
+
+def test_pipeline_fails_requests_when_session_cannot_start(transport):
+    Terminal.transport = DownTransport(latency = 0)
+
+    with pytest.raises(Exception, match = 'terminal is down'):
+        ReferenceDataRequest(['IBM US Equity'] * 10, ['PX_LAST'], batch_size = 2).execute()
+
+def test_pipeline_rejects_submits_once_stopped():
+    pipeline = RequestPipeline(DownTransport(latency = 0))
+    pipeline.start()
+    pipeline.join(5)
+
+    assert not pipeline.is_alive()
+    assert 'terminal is down' in str(pipeline.submit(None).exception(5))
+
+def test_pipeline_batches_against_simulator(transport):
+    Terminal.transport = SimTransport(latency = 0)
+
+    request = ReferenceDataRequest(['IBM US Equity', 'MSFT US Equity', 'AAPL US Equity'], ['PX_LAST'],
+                                   batch_size = 2)
+    request.execute()
+
+    assert list(request.response.index) == ['IBM US Equity', 'MSFT US Equity', 'AAPL US Equity']
+
+def test_large_universes_batched_by_default(transport):
+    # the terminal rejects requests for more than 500 securities
+    Terminal.transport = SimTransport(latency = 0, max_securities = 500)
+
+    universe = ['S%04d US Equity' % i for i in range(0, 1200)]
+
+    assert len(ReferenceDataRequest(universe[0:500], ['PX_LAST']).batches()) == 1
+
+    request = ReferenceDataRequest(universe, ['PX_LAST'])
+    assert [len(b[0]) for b in request.batches()] == [500, 500, 200]
+
+    request.execute()
+    assert list(request.response.index) == universe
+
+    with pytest.raises(Exception):
+        ReferenceDataRequest(universe, ['PX_LAST'], batch_size = None).execute()
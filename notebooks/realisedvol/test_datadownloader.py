@@ -0,0 +1,92 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+import datetime
+import threading
+
+import pandas
+
+import bbg_com
+from bbg_sim import SimTransport
+from datadownloader import DataDownloader
+from stubs import StubDataSource
+
+class CountingDataSource(StubDataSource):
+    # keeps the most downloads seen in flight at once
+
+    def __init__(self, **kwargs):
+        StubDataSource.__init__(self, **kwargs)
+
+        self.in_flight = 0
+        self.peak = 0
+        self.count_lock = threading.Lock()
+
+    def download_time_series(self, vendor_ticker, pretty_ticker, start_date, freq):
+        with self.count_lock:
+            self.in_flight = self.in_flight + 1
+            self.peak = max(self.peak, self.in_flight)
+
+        try:
+            return StubDataSource.download_time_series(self, vendor_ticker, pretty_ticker, start_date, freq)
+        finally:
+            with self.count_lock: self.in_flight = self.in_flight - 1
+
+def test_download_many(monkeypatch):
+    stub = CountingDataSource(first_date = datetime.datetime(2015, 1, 1), finish_date = datetime.datetime(2015, 6, 1),
+                              latency = 0.05)
+
+    monkeypatch.setitem(DataDownloader.max_concurrent, 'counting', 2)
+    monkeypatch.delitem(DataDownloader.executors, 'counting', raising = False)
+
+    tickers = [('T' + str(i), 'T' + str(i) + '.close') for i in range(0, 8)] + [('BADTICKER', 'BAD.close')]
+
+    try:
+        frame, info = DataDownloader(sources = {'counting': stub}).download_many(tickers, None, source = 'counting')
+    finally:
+        DataDownloader.executors.pop('counting').shutdown()
+
+    assert stub.peak == 2
+
+    # one column per ticker which downloaded, on the dates of them all
+    assert list(frame.columns) == [t[1] for t in tickers[0:-1]]
+    assert len(frame.index) == len(stub.history('T0', 'daily').index)
+    assert frame.notnull().all().all()
+
+    assert sorted(info.keys()) == sorted([t[1] for t in tickers])
+
+    for vendor_ticker, pretty_ticker in tickers[0:-1]:
+        assert info[pretty_ticker]['vendor_ticker'] == vendor_ticker
+        assert info[pretty_ticker]['source'] == 'counting'
+        assert info[pretty_ticker]['rows'] == len(frame.index)
+        assert info[pretty_ticker]['error'] is None
+        assert info[pretty_ticker]['elapsed'] >= 0.05
+
+    assert info['BAD.close']['rows'] == 0
+    assert 'BADTICKER' in info['BAD.close']['error']
+
+def test_long_intraday_bloomberg_ranges_sliced(monkeypatch):
+    monkeypatch.setattr(bbg_com.Terminal, 'transport', SimTransport(latency = 0))
+
+    slices = []
+    original = bbg_com.IntrdayBarRequest.slices
+    monkeypatch.setattr(bbg_com.IntrdayBarRequest, 'slices', lambda req: slices.append(original(req)) or slices[-1])
+
+    start = datetime.datetime(2015, 1, 1)
+    finish = start + datetime.timedelta(days = 200)
+
+    try:
+        sliced = DataDownloader().download_time_series('EURUSD Curncy', 'EURUSD', start, 'Bloomberg', freq = 'intraday',
+                                                       freq_no = 60, finish_date = finish)
+
+        monkeypatch.setattr(DataDownloader, 'bloomberg_slice_days', None)
+        whole = DataDownloader().download_time_series('EURUSD Curncy', 'EURUSD', start, 'Bloomberg', freq = 'intraday',
+                                                      freq_no = 60, finish_date = finish)
+    finally:
+        bbg_com.Terminal.close_sessions()
+
+    assert [len(s) for s in slices] == [7, 1]
+    pandas.testing.assert_frame_equal(sliced, whole)
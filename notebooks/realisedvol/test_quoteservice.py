@@ -0,0 +1,101 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+import asyncio
+import math
+
+import pytest
+
+from quoteservice import LiveQuoteService, parse_quotes
+from stubs import StubQuoteServer
+
+TICKERS = ['EURUSD=X', 'GBPUSD=X', 'USDJPY=X', 'AUDUSD=X', 'BAD=X']
+
+@pytest.fixture
+def server():
+    server = StubQuoteServer()
+    server.start()
+    yield server
+    server.stop()
+
+def test_parse_quotes_types_fields():
+    quotes = parse_quotes('"EURUSD=X",1.1234,"6/16/2015","2:56pm",0.0012,1.1222,1.1301,1.1200,1500\r\n'
+                          '"BAD=X",N/A,"N/A","N/A",N/A,N/A,N/A,N/A,N/A\r\n'
+                          'truncated,row\r\n')
+
+    assert len(quotes) == 2
+
+    eurusd, bad = quotes
+    assert eurusd.symbol == 'EURUSD=X'
+    assert (eurusd.price, eurusd.change, eurusd.open, eurusd.high, eurusd.low) == \
+           (1.1234, 0.0012, 1.1222, 1.1301, 1.1200)
+    assert (eurusd.date, eurusd.time) == ('6/16/2015', '2:56pm')
+    assert eurusd.volume == 1500 and isinstance(eurusd.volume, int)
+
+    assert all([math.isnan(getattr(bad, f)) for f in ['price', 'change', 'open', 'high', 'low', 'volume']])
+
+def test_quotes_match_those_served(server):
+    async def poll():
+        service = LiveQuoteService(TICKERS, url = server.url, tickers_per_request = 2)
+
+        try:
+            return await service.poll_once()
+        finally:
+            service.pool.close()
+
+    quotes = asyncio.run(poll())
+
+    assert sorted(quotes.keys()) == sorted(TICKERS)
+
+    for ticker in TICKERS[0:-1]:
+        assert isinstance(quotes[ticker].price, float)
+        assert quotes[ticker].price == server.prices[ticker]
+        assert quotes[ticker].volume == 0
+
+    assert math.isnan(quotes['BAD=X'].price)
+
+def test_connections_reused(server):
+    async def poll():
+        service = LiveQuoteService(TICKERS, url = server.url, tickers_per_request = 2, max_connections = 2)
+
+        try:
+            for i in range(0, 5):
+                await service.poll_once()
+        finally:
+            service.pool.close()
+
+        return service.pool
+
+    pool = asyncio.run(poll())
+
+    # 3 requests a round for 5 rounds, over no more connections than can be in flight at once
+    assert pool.requests == 15
+    assert pool.connections_opened <= 2
+    assert server.connections == pool.connections_opened
+
+def test_retries_after_server_disconnect(server):
+    async def poll():
+        service = LiveQuoteService(TICKERS, url = server.url, tickers_per_request = 2, max_connections = 2)
+
+        try:
+            await service.poll_once()
+            opened = service.pool.connections_opened
+
+            # as a server timing out idle keep-alive connections would
+            server.disconnect()
+            await asyncio.sleep(0.1)
+
+            return service, opened, await service.poll_once()
+        finally:
+            service.pool.close()
+
+    service, opened, quotes = asyncio.run(poll())
+
+    assert len(quotes) == len(TICKERS)
+    assert service.failed_requests == 0
+    assert service.pool.retries > 0
+    assert service.pool.connections_opened > opened
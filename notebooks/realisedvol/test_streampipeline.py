@@ -0,0 +1,57 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+import time
+
+from datadownloader import DataDownloader
+from streampipeline import TickBuffer, QuotePoller, BatchPublisher
+from stubs import StubQuoteServer
+
+class ListStream:
+    # stands in for a py.Stream, keeping what is written to it
+
+    def __init__(self):
+        self.points = []
+
+    def write(self, point):
+        self.points.append(point)
+
+def test_poller_publishes_many_tickers():
+    server = StubQuoteServer()
+    server.start()
+
+    tickers = ['EURUSD=X', 'GBPUSD=X', 'USDJPY=X', 'BAD=X']
+    data_downloader = DataDownloader()
+
+    def poll(vendor_tickers):
+        quotes = data_downloader.download_live_quotes(vendor_tickers, 'Yahoo', url = server.url)
+
+        return [(t, time.time(), q.price) for t, q in quotes.items() if q.price == q.price]
+
+    streams = dict((t, ListStream()) for t in tickers[0:-1])
+
+    tick_buffer = TickBuffer()
+    poller = QuotePoller(tick_buffer, poll, interval = 0.05, tickers = tickers)
+    publisher = BatchPublisher(tick_buffer, streams, flush_interval = 0.05)
+
+    try:
+        publisher.start()
+        poller.start()
+
+        time.sleep(0.5)
+    finally:
+        poller.stop()
+        publisher.stop()
+        server.stop()
+
+    assert poller.polls >= 3 and poller.failed_polls == 0
+    assert publisher.failed_writes == 0
+
+    # every ticker got a point each poll, ending with the last price served
+    for t, stream in streams.items():
+        assert len(stream.points) == poller.polls
+        assert stream.points[-1]['y'] == server.prices[t]
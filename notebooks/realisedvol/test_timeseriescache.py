@@ -0,0 +1,54 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+import datetime
+
+import pandas
+
+from datadownloader import DataDownloader
+from stubs import StubDataSource
+from timeseriescache import TimeSeriesCache
+
+def test_hit_downloads_only_the_tail(tmpdir):
+    stub = StubDataSource(finish_date = datetime.datetime(2015, 6, 1))
+    cache = TimeSeriesCache(cache_dir = str(tmpdir))
+    downloader = DataDownloader(cache = cache, sources = {'stub': stub})
+
+    first = downloader.download_time_series('EURUSD', 'EURUSD.close', '2015-01-01', 'stub')
+
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 0
+    assert stub.rows_served == len(first.index)
+
+    # a week later only the days since the last cached one come from the source
+    stub.finish_date = datetime.datetime(2015, 6, 8)
+    served = stub.rows_served
+
+    second = downloader.download_time_series('EURUSD', 'EURUSD.close', '2015-01-01', 'stub')
+
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 1
+    assert stub.rows_served - served == 6
+    assert stats['bytes_saved'] == (len(first.index) - 1) * 8
+
+    # the merged frame is what downloading everything again would have given
+    expected = stub.download_time_series('EURUSD', 'EURUSD.close', '2015-01-01', 'daily')
+
+    pandas.testing.assert_frame_equal(second, expected, check_freq = False)
+
+def test_tail_replaces_cached_dates(tmpdir):
+    cache = TimeSeriesCache(cache_dir = str(tmpdir))
+    index = pandas.bdate_range('2015-06-01', '2015-06-05')
+
+    cache.fetch(('stub', 'EURUSD', 'daily'), None, lambda start: pandas.DataFrame({'x': 1.0}, index = index))
+
+    # a source which sends back more than the last date, with some days revised since
+    revised = pandas.DataFrame({'x': 2.0}, index = pandas.bdate_range('2015-06-03', '2015-06-09'))
+
+    frame = cache.fetch(('stub', 'EURUSD', 'daily'), None, lambda start: revised)
+
+    assert list(frame.index) == list(pandas.bdate_range('2015-06-01', '2015-06-09'))
+    assert list(frame['x']) == [1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 2.0]
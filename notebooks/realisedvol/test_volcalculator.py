@@ -0,0 +1,57 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+import tracemalloc
+
+import numpy
+
+from datadownloader import DataDownloader
+from stubs import write_synthetic_csv
+from volcalculator import VolCalculator, ChunkedRealisedVol
+
+def test_chunked_realised_vol_memory(tmpdir):
+    # small enough to run quickly, big enough that reading it whole would use several times the ceiling
+    rows = 300000; chunksize = 20000; ceiling_mb = 16
+    minute_freq = [1, 5, 10, 30, 60]
+
+    data_downloader = DataDownloader()
+    csv_file = write_synthetic_csv(rows, chunksize, folder = str(tmpdir))
+
+    tracemalloc.start()
+
+    try:
+        chunked_vol = ChunkedRealisedVol(minute_freq)
+
+        for spot in data_downloader.download_time_series('EURUSD', 'EURUSD', None, 'CSV', csv_file = csv_file,
+                                                         freq = 'intraday', chunksize = chunksize):
+            chunked_last = chunked_vol.realised_vol(spot).iloc[-1]
+
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert peak < ceiling_mb * 1e6
+
+    spot = data_downloader.read_csv(csv_file, data_downloader.intraday_date_formats)
+    whole_last = VolCalculator().realised_vol_multi_freq(spot, minute_freq).iloc[-1]
+
+    assert numpy.allclose(chunked_last.values, whole_last.values, rtol = 1e-9, equal_nan = True)
+
+def test_chunks_limited_to_dates(tmpdir):
+    data_downloader = DataDownloader()
+    csv_file = write_synthetic_csv(10000, folder = str(tmpdir))
+
+    chunks = list(data_downloader.download_time_series('EURUSD', 'EURUSD', '2005-01-02 00:00', 'CSV',
+                                                       csv_file = csv_file, freq = 'intraday',
+                                                       finish_date = '2005-01-03 12:00', chunksize = 1000))
+
+    whole = data_downloader.download_time_series('EURUSD', 'EURUSD', '2005-01-02 00:00', 'CSV', csv_file = csv_file,
+                                                 freq = 'intraday', finish_date = '2005-01-03 12:00')
+
+    # chunks follow the rows of the file, trimmed to the dates
+    assert [len(c.index) for c in chunks] == [560, 1000, 601]
+    assert list(numpy.concatenate([c.index.values for c in chunks])) == list(whole.index.values)
@@ -0,0 +1,112 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for file handling
+import os
+import json
+
+# for time series manipulation
+import numpy
+import pandas
+
+class TickStore:
+    # TickStore - keeps a columnar binary copy of an intraday CSV file next to it
+    #
+    # the CSV is parsed once and written as two flat arrays (int64 epoch nanoseconds and float64 closes),
+    # later loads memory map those arrays, so no parsing is done and nothing is copied into memory
+    # until it is used
+    #
+
+    time_file = 'time.npy'
+    close_file = 'close.npy'
+    meta_file = 'meta.json'
+
+    def store_path(self, csv_file):
+        # store_path - folder where the columnar copy of csv_file lives
+        #
+        # csv_file = path of the CSV file
+        #
+
+        return csv_file + '.store'
+
+    def is_stale(self, csv_file):
+        # is_stale - checks whether the store is missing or older than the CSV file
+        #
+        # csv_file = path of the CSV file
+        #
+
+        meta_path = os.path.join(self.store_path(csv_file), self.meta_file)
+
+        if not os.path.exists(meta_path):
+            return True
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+
+        stat = os.stat(csv_file)
+
+        return meta['mtime'] != stat.st_mtime or meta['size'] != stat.st_size
+
+    def write(self, csv_file, spot):
+        # write - writes a single column intraday data frame to the store for csv_file
+        #
+        # csv_file = path of the CSV file the data frame was loaded from
+        # spot = data frame with a DatetimeIndex and a single column of closes
+        #
+
+        path = self.store_path(csv_file)
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        # sorted, so read can binary search the times
+        spot = spot.sort_index()
+
+        time = pandas.DatetimeIndex(spot.index).values.astype('datetime64[ns]').view(numpy.int64)
+        close = spot[spot.columns[0]].values.astype(numpy.float64)
+
+        # meta is written last, so a half written store is always considered stale
+        meta_path = os.path.join(path, self.meta_file)
+
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        numpy.save(os.path.join(path, self.time_file), time)
+        numpy.save(os.path.join(path, self.close_file), close)
+
+        stat = os.stat(csv_file)
+
+        with open(meta_path, 'w') as f:
+            json.dump({'mtime': stat.st_mtime, 'size': stat.st_size, 'column': str(spot.columns[0]),
+                       'rows': len(time)}, f)
+
+    def read(self, csv_file, start_date = None, finish_date = None):
+        # read - memory maps the store for csv_file as a data frame
+        #
+        # csv_file = path of the CSV file
+        # start_date, finish_date = only return rows between these dates (None for no limit), found by binary
+        #                           search on the sorted times, so rows outside them are never paged in
+        #
+
+        path = self.store_path(csv_file)
+
+        with open(os.path.join(path, self.meta_file), 'r') as f:
+            meta = json.load(f)
+
+        time = numpy.load(os.path.join(path, self.time_file), mmap_mode = 'r')
+        close = numpy.load(os.path.join(path, self.close_file), mmap_mode = 'r')
+
+        first = 0 if start_date is None else numpy.searchsorted(time, pandas.Timestamp(start_date).value, 'left')
+        last = len(time) if finish_date is None else numpy.searchsorted(time, pandas.Timestamp(finish_date).value,
+                                                                        'right')
+
+        time = time[first:last]
+        close = close[first:last]
+
+        index = pandas.DatetimeIndex(time.view('datetime64[ns]'))
+
+        return pandas.DataFrame(data = close.reshape(-1, 1), index = index, columns = [meta['column']], copy = False)
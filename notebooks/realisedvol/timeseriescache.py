@@ -0,0 +1,125 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for file handling
+import os
+import pickle
+import re
+import threading
+
+# for time series manipulation
+import pandas
+
+class TimeSeriesCache:
+    # TimeSeriesCache - keeps downloaded history on disk by (source, vendor_ticker, freq), so later downloads
+    # only need to ask the source for the tail of the history since the last cached date
+    #
+
+    def __init__(self, cache_dir = 'cache'):
+        # cache_dir = folder the cached history is pickled into
+        #
+
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+
+    def path(self, key):
+        # path - file the history for key is kept in
+        #
+        # key = (source, vendor_ticker, freq)
+        #
+
+        return os.path.join(self.cache_dir, re.sub('[^A-Za-z0-9_.=-]', '_', '-'.join([str(k) for k in key])) + '.pkl')
+
+    def load(self, key):
+        # load - returns (start_date, frame) cached for key or None
+        #
+
+        path = self.path(key)
+
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, key, start_date, frame):
+        # save - writes the history for key (to a temporary file first, so a failed write leaves the old one)
+        #
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        path = self.path(key)
+
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump((start_date, frame), f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + '.tmp', path)
+
+    def fetch(self, key, start_date, download):
+        # fetch - history for key from start_date, downloading only what isn't cached
+        #
+        # key = (source, vendor_ticker, freq)
+        # start_date = first date wanted (None for all the history the source has)
+        # download = function taking a start date and returning a data frame from the source
+        #
+
+        cached = self.load(key)
+
+        if start_date is not None:
+            start_date = pandas.Timestamp(start_date)
+
+        # cache covers the start (if we asked for everything before, we have everything now)
+        covered = cached is not None and len(cached[1].index) > 0 and \
+                  (cached[0] is None or (start_date is not None and start_date >= cached[0]))
+
+        if covered:
+            cached_start, frame = cached
+
+            # the last cached date is downloaded again, in case it was still changing when we cached it (and
+            # whatever the source sends back replaces what we had cached for those dates)
+            tail = download(frame.index[-1])
+            tail.columns = frame.columns
+            kept = frame.loc[frame.index < tail.index[0]] if len(tail.index) > 0 else frame
+
+            frame = pandas.concat([kept, tail])
+
+            with self.lock:
+                self.hits = self.hits + 1
+                self.bytes_saved = self.bytes_saved + int(kept.values.nbytes)
+                self.bytes_downloaded = self.bytes_downloaded + int(tail.values.nbytes)
+        else:
+            cached_start = start_date
+            frame = download(start_date)
+
+            with self.lock:
+                self.misses = self.misses + 1
+                self.bytes_downloaded = self.bytes_downloaded + int(frame.values.nbytes)
+
+        self.save(key, cached_start, frame)
+
+        if start_date is not None:
+            frame = frame.loc[frame.index >= start_date]
+
+        return frame.copy()
+
+    def stats(self):
+        # stats - hit/miss counters and bytes not downloaded thanks to the cache
+        #
+
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes_saved': self.bytes_saved,
+                'bytes_downloaded': self.bytes_downloaded
+            }
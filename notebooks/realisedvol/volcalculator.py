@@ -0,0 +1,311 @@
+__author__ = 'saeedamen'
+
+"""
+    Thalesians Ltd (www.pythalesians.com) please contact saeed@pythalesians.com for further information
+    You are free to modify and distribute this code as you see fit provided this source is cited
+"""
+
+# for time series/maths
+from collections import deque
+import math
+import numpy
+import pandas
+
+class VolCalculator:
+    def annualisation_factor(self, frequency):
+        # annualisation_factor - scales a standard deviation of returns sampled every frequency minutes
+        # to an annualised vol in percent
+        #
+        # frequency = sampling frequency in minutes
+        #
+
+        return math.sqrt(252.0 * (1440.0 / frequency)) * 100
+
+    def prefix_sums(self, rets):
+        # prefix_sums - cumulative sums of returns and squared returns (with a leading zero)
+        #
+        # rets = numpy array of returns
+        #
+        # the returns are demeaned first, which doesn't change their variance but stops the squared sums
+        # from swamping the differences we take later
+        #
+
+        demeaned = rets - rets.mean() if len(rets) > 0 else rets
+
+        sum_rets = numpy.zeros(len(rets) + 1)
+        sum_sq_rets = numpy.zeros(len(rets) + 1)
+
+        numpy.cumsum(demeaned, out = sum_rets[1:])
+        numpy.cumsum(demeaned * demeaned, out = sum_sq_rets[1:])
+
+        return sum_rets, sum_sq_rets
+
+    def rolling_std_from_prefix_sums(self, sum_rets, sum_sq_rets, window):
+        # rolling_std_from_prefix_sums - rolling sample standard deviation over windows of returns
+        #
+        # sum_rets, sum_sq_rets = prefix sums from prefix_sums
+        # window = number of returns in each window
+        #
+        # returns an array as long as the returns, the first window - 1 values are NaN (as with pandas.rolling_std)
+        #
+
+        n = len(sum_rets) - 1
+        std = numpy.empty(n); std.fill(numpy.nan)
+
+        if window < 2 or window > n:
+            return std
+
+        sums = sum_rets[window:] - sum_rets[:-window]
+        sq_sums = sum_sq_rets[window:] - sum_sq_rets[:-window]
+
+        var = (sq_sums - sums * sums / window) / (window - 1)
+
+        std[window - 1:] = numpy.sqrt(numpy.maximum(var, 0))
+
+        return std
+
+    def rolling_std(self, rets, window):
+        # rolling_std - rolling sample standard deviation of returns, NaN where the window has any NaN
+        # (the same as pandas.rolling_std with min_periods = window)
+        #
+        # rets = numpy array of returns
+        # window = number of returns in each window
+        #
+
+        bad = numpy.isnan(rets)
+        sum_rets, sum_sq_rets = self.prefix_sums(numpy.where(bad, 0.0, rets))
+
+        std = self.rolling_std_from_prefix_sums(sum_rets, sum_sq_rets, window)
+
+        if bad.any() and window <= len(rets):
+            bad_count = numpy.concatenate(([0], numpy.cumsum(bad)))
+            std[window - 1:][(bad_count[window:] - bad_count[:-window]) > 0] = numpy.nan
+
+        return std
+
+    def realised_vol_multi_freq(self, spot, minute_freq, window_mins = 1440.0):
+        # realised_vol_multi_freq - annualised realised vol in percent of spot, sampled at several minute frequencies
+        #
+        # spot = intraday price data frame (single column)
+        # minute_freq = list of sampling frequencies in minutes
+        # window_mins = length of the rolling window in minutes (default = 1 day)
+        #
+        # returns one column per frequency ('1min', '5min' etc), aligned on every time that at least one
+        # frequency samples, filled in place rather than by outer joining each frequency
+        #
+
+        return ChunkedRealisedVol(minute_freq, window_mins).realised_vol(spot)
+
+class ChunkedRealisedVol:
+    # ChunkedRealisedVol - realised vol at several minute frequencies over a price history which arrives in
+    # consecutive chunks (eg. from DataDownloader.iterate_csv), carrying the last price and the returns still
+    # inside the rolling window from one chunk to the next, so only one chunk is held in memory at a time
+    #
+    # the chunks' results joined together are the same as realised_vol_multi_freq over the whole history
+    #
+
+    def __init__(self, minute_freq, window_mins = 1440.0):
+        # minute_freq = list of sampling frequencies in minutes
+        # window_mins = length of the rolling window in minutes (default = 1 day)
+        #
+
+        self.minute_freq = minute_freq
+        self.windows = [int(window_mins / m) for m in minute_freq]
+        self.vol_calculator = VolCalculator()
+
+        # per frequency, last sampled price and the latest window - 1 returns
+        self.last_prices = [None] * len(minute_freq)
+        self.tail_rets = [numpy.empty(0)] * len(minute_freq)
+
+    def realised_vol(self, spot):
+        # realised_vol - annualised realised vol in percent for the next chunk of spot
+        #
+        # spot = intraday price data frame (single column), following on from the previous chunk
+        #
+        # returns one column per frequency ('1min', '5min' etc), aligned on every time that at least one
+        # frequency samples, filled in place rather than by outer joining each frequency
+        #
+
+        prices = numpy.ascontiguousarray(spot[spot.columns[0]].values, dtype = numpy.float64)
+        minutes = numpy.asarray(spot.index.minute)
+
+        samples = [numpy.nonzero(minutes % m == 0)[0] for m in self.minute_freq]
+
+        sampled = numpy.zeros(len(prices), dtype = bool)
+
+        for s in samples:
+            sampled[s] = True
+
+        # row of each spot time in the output
+        rows = numpy.cumsum(sampled) - 1
+
+        vol = numpy.empty((int(sampled.sum()), len(self.minute_freq))); vol.fill(numpy.nan)
+
+        for j in range(0, len(self.minute_freq)):
+            p = prices[samples[j]]
+
+            if len(p) == 0: continue
+
+            # the first price of the chunk has a return if we have a price from the previous chunk
+            if self.last_prices[j] is None:
+                new_rets = p[1:] / p[:-1] - 1
+                ret_rows = rows[samples[j][1:]]
+            else:
+                new_rets = p / numpy.concatenate(([self.last_prices[j]], p[:-1])) - 1
+                ret_rows = rows[samples[j]]
+
+            rets = numpy.concatenate((self.tail_rets[j], new_rets))
+            std = self.vol_calculator.rolling_std(rets, self.windows[j])
+
+            vol[ret_rows, j] = std[len(self.tail_rets[j]):] * self.vol_calculator.annualisation_factor(self.minute_freq[j])
+
+            self.last_prices[j] = p[-1]
+            self.tail_rets[j] = rets[max(len(rets) - (self.windows[j] - 1), 0):].copy()
+
+        return pandas.DataFrame(data = vol, index = spot.index[sampled],
+                                columns = [str(m) + 'min' for m in self.minute_freq])
+
+class ReturnCube:
+    # ReturnCube - returns for every sampling frequency of an intraday price series, with prefix sums
+    # so that the realised vol for any (frequency, period) is a vectorised difference, rather than a rolling window
+    #
+
+    def __init__(self, spot, frequencies):
+        # spot = intraday price data frame (single column)
+        # frequencies = sampling frequencies in minutes to precompute
+        #
+
+        self.spot = spot
+        self.vol_calculator = VolCalculator()
+        self.cube = {}
+
+        for frequency in frequencies:
+            self.add_frequency(frequency)
+
+    def add_frequency(self, frequency):
+        # add_frequency - resamples spot every frequency minutes and stores its returns and prefix sums
+        #
+        # frequency = sampling frequency in minutes
+        #
+
+        frequency = int(frequency)
+
+        resampled = self.spot.loc[self.spot.index.minute % frequency == 0]
+        resampled = resampled.dropna()
+
+        prices = resampled[resampled.columns[0]].values.astype(numpy.float64)
+        rets = prices[1:] / prices[:-1] - 1
+
+        sum_rets, sum_sq_rets = self.vol_calculator.prefix_sums(rets)
+
+        self.cube[frequency] = (resampled.index, sum_rets, sum_sq_rets)
+
+    def realised_vol(self, frequency, period):
+        # realised_vol - annualised realised vol in percent, sampled every frequency minutes over period days
+        #
+        # frequency = sampling frequency in minutes
+        # period = window in days
+        #
+
+        frequency = int(frequency)
+
+        if frequency not in self.cube:
+            self.add_frequency(frequency)
+
+        index, sum_rets, sum_sq_rets = self.cube[frequency]
+        window = int(period * (1440.0 / frequency))
+
+        vol = numpy.empty(len(index)); vol.fill(numpy.nan)
+
+        # first price has no return
+        vol[1:] = self.vol_calculator.rolling_std_from_prefix_sums(sum_rets, sum_sq_rets, window) \
+                  * self.vol_calculator.annualisation_factor(frequency)
+
+        return pandas.DataFrame(data = vol, index = index, columns = self.spot.columns)
+
+class StreamingRealisedVol:
+    # StreamingRealisedVol - realised vol over a rolling window which is updated one bar at a time
+    #
+    # keeps a running mean and sum of squared deviations of the returns in the window (Welford's algorithm,
+    # with the oldest return swapped out once the window is full), so each update is O(1) whatever the window
+    #
+
+    def __init__(self, frequency, period):
+        # frequency = sampling frequency in minutes
+        # period = window in days
+        #
+
+        self.frequency = int(frequency)
+        self.window = int(period * (1440.0 / frequency))
+        self.factor = VolCalculator().annualisation_factor(frequency)
+
+        self.rets = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        self.last_price = None
+        self.last_minute = None
+
+    def add_return(self, ret):
+        # add_return - pushes a return into the window, dropping the oldest one if the window is full
+        #
+        # ret = return since the previous sampled price
+        #
+
+        if self.window < 1:
+            return
+
+        if len(self.rets) < self.window:
+            self.rets.append(ret)
+
+            delta = ret - self.mean
+            self.mean = self.mean + delta / len(self.rets)
+            self.m2 = self.m2 + delta * (ret - self.mean)
+        else:
+            old = self.rets.popleft()
+            self.rets.append(ret)
+
+            old_mean = self.mean
+            self.mean = old_mean + (ret - old) / self.window
+            self.m2 = self.m2 + (ret - old) * (ret - self.mean + old - old_mean)
+
+    def update(self, timestamp, price):
+        # update - ingests a bar and returns the latest annualised vol (NaN until the window is full)
+        #
+        # timestamp = time of the bar
+        # price = price of the bar
+        #
+        # only the first bar in each minute which is a multiple of frequency is sampled, so feeding
+        # quotes more often than every minute gives the same result as minute bars
+        #
+
+        if timestamp.minute % self.frequency == 0 and price == price:
+            minute = (timestamp.year, timestamp.month, timestamp.day, timestamp.hour, timestamp.minute)
+
+            if minute != self.last_minute:
+                if self.last_price is not None:
+                    self.add_return(price / self.last_price - 1)
+
+                self.last_price = price
+                self.last_minute = minute
+
+        return self.vol
+
+    def seed(self, spot):
+        # seed - warms the window up with the tail of a historical price series
+        #
+        # spot = intraday price data frame (single column), at least as recent as the bars which follow
+        #
+
+        resampled = spot.loc[spot.index.minute % self.frequency == 0].dropna()
+        resampled = resampled.iloc[-(self.window + 1):]
+
+        for timestamp, price in zip(resampled.index, resampled[resampled.columns[0]].values):
+            self.update(timestamp, float(price))
+
+    @property
+    def vol(self):
+        if self.window < 2 or len(self.rets) < self.window:
+            return numpy.nan
+
+        return math.sqrt(max(self.m2 / (self.window - 1), 0)) * self.factor
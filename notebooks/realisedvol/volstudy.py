@@ -17,10 +17,14 @@ from plotly.graph_objs import *
 
 # for data downloading
 from datadownloader import DataDownloader
+from timeseriescache import TimeSeriesCache
 
 # for event analysis/plotting
 from plothelper import PlotHelper
 
+# for realised vol calculations
+from volcalculator import VolCalculator
+
 postfix = "test" # what to put at the end of the Plotly URL
 
 def vol_study():
@@ -36,19 +40,23 @@ def vol_study():
     ##### Download intraday EUR/USD data from Bloomberg or CSV file
     source = "Bloomberg"
     source = "CSV"
+    source = "store"   # binary copy of the CSV, which is only parsed on first use
 
     csv_file = None
 
     plot_helper = PlotHelper()
+    vol_calculator = VolCalculator()
 
-    data_downloader = DataDownloader()
+    # daily history is kept on disk, so reruns only download the days since the last run
+    data_downloader = DataDownloader(cache = TimeSeriesCache())
     start_date = datetime.datetime.utcnow() - timedelta(days = 120)
     freq = 'intraday'
 
     if source == 'Bloomberg':
         vendor_ticker = 'EURUSD BGN Curncy'
-    elif source == 'CSV':
+    elif source in ('CSV', 'store'):
         vendor_ticker = 'EURUSD'
+        start_date = None   # the sample file is historic, so read all of it
         csv_file = 'D:/EURUSD.csv'
 
     spot = data_downloader.download_time_series(vendor_ticker, ticker, start_date, source, csv_file = csv_file, freq = freq)
@@ -56,19 +64,7 @@ def vol_study():
     #### Calculate 1 day realised vol on EUR/USD data from Bloomberg using different data frequency (1 min, ..., 60 min)
     minute_freq = [1, 5, 10, 30, 60]
 
-    realised_vol = None
-
-    for min in minute_freq:
-        spot_min = spot.loc[spot.index.minute % min == 0]
-        rets = spot_min / spot_min.shift(1) - 1
-        realised_vol_min = pandas.rolling_std(rets, 1440.0 / min) * math.sqrt(252.0 * (1440.0 / min)) * 100
-        realised_vol_min.columns = [str(min) + 'min']
-        if realised_vol is None: realised_vol = realised_vol_min
-        else:
-            realised_vol = realised_vol.join(realised_vol_min, how = 'outer')
-
-    # reduce the number of points to plot
-    realised_vol = realised_vol.loc[realised_vol.index.minute % 60 == 0]
+    realised_vol = vol_calculator.realised_vol_multi_freq(spot, minute_freq)
 
     xaxis = 'Date'
     yaxis = 'Daily Realised Vol'
@@ -82,7 +78,9 @@ def vol_study():
     # also apply graduated color scheme of blues (from light to dark)
     # see http://moderndata.plot.ly/color-scales-in-ipython-notebook/ for details on colorlover package
     # which allows you to set scales
-    fig = Figure(data = plot_helper.convert_df_plotly(realised_vol, gradcolor = 'Blues', addmarker=False),
+    # reduce the number of points to plot (keeping the peaks)
+    fig = Figure(data = plot_helper.convert_df_plotly(realised_vol, gradcolor = 'Blues', addmarker=False,
+                                                      downsample = 'minmax'),
                  layout = plot_helper.create_layout(title, xaxis, yaxis),
     )
 
@@ -93,8 +91,15 @@ def vol_study():
     source = 'Yahoo'
 
     start_date = datetime.datetime.utcnow() - timedelta(days = 365)
-    spx = data_downloader.download_time_series('^GSPC', 'S&P500', start_date, source)
-    vix = data_downloader.download_time_series('^VIX', 'VIX', start_date, source)
+    spot_daily, info = data_downloader.download_many([('^GSPC', 'S&P500'), ('^VIX', 'VIX')], start_date, source)
+
+    for pretty_ticker in info:
+        if info[pretty_ticker]['error'] is not None:
+            raise Exception('Failed to download ' + pretty_ticker + ': ' + info[pretty_ticker]['error'])
+
+    spx = spot_daily[['S&P500']].dropna(); vix = spot_daily[['VIX']].dropna()
+
+    print('Download cache: ' + str(data_downloader.cache.stats()))
 
     # calculate realised vol on S&P500 (and shift it to be aligned to VIX - implied vol)
     spx_realised_vol = pandas.rolling_std(spx / spx.shift(1) - 1, 20) * math.sqrt(252) * 100